@@ -1,74 +1,39 @@
-import contextlib
-import time
+import argparse
 
-from sigmar.windows import get_screenshot, click_in_window, click_new_game
-from sigmar.vision import detect_board
-from sigmar.solver import solve_game, UnsolveableBoardError
-from sigmar.board import Element
-
-
-class ActiveBoard(object):
-    def __init__(self, board, layout):
-        self.board = board
-        self.layout = layout
-
-    def take(self, h):
-        pt = self.layout.hex_to_pixel(h)
-        click_in_window(pt.x, pt.y)
-        return self.board.take(h)
-
-
-@contextlib.contextmanager
-def timer(text):
-    print(f"{text}...", end="", flush=True)
-    start = time.time()
-    yield
-    elapsed = time.time() - start
-    print(f"done (took {elapsed:0.3f}s)")
-
-
-def validate_board(board):
-    import collections
-    elements = collections.Counter()
-    for h, el in board.tiles:
-        elements[el] += 1
-
-    for el in Element.Cardinals:
-        assert elements[el] == 8
-    for el in Element.Metals:
-        assert elements[el] == 1
-    assert elements[Element.SALT] == 4
-    assert elements[Element.QUICKSILVER] == 5
-    assert elements[Element.MORS] == 4
-    assert elements[Element.VITAE] == 4
-
-    print("Board looks legit!")
+from sigmar.windows import Win32Driver, get_screenshot
+from sigmar.execute import Executor
+from sigmar.vision import LAYOUT, board_table, warm_up
+from sigmar.cache import SolutionCache
+from sigmar.game import play_game, record_outcome
+from sigmar.metrics import Metrics, flush_periodically, serve_prometheus
 
 
 def main():
-    while True:
-        click_new_game()
-        image = get_screenshot()
-
-        with timer("Reading board"):
-            board, layout = detect_board(image)
+    parser = argparse.ArgumentParser(prog="python -m sigmar", description="Play Sigmar's Garden until stopped.")
+    parser.add_argument("--metrics-file", default="metrics.jsonl",
+                        help="file to append a JSON snapshot of the metrics to (default: metrics.jsonl)")
+    parser.add_argument("--metrics-interval", type=float, default=60,
+                        help="seconds between metrics snapshots (default: 60)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    metrics = Metrics(echo=True)
+    if args.metrics_file:
+        flush_periodically(metrics, args.metrics_file, args.metrics_interval)
+    if args.metrics_port:
+        serve_prometheus(metrics, args.metrics_port)
+
+    cache = SolutionCache()
+    with metrics.stage("Loading classifier"):
+        warm_up()
+
+    executor = Executor(Win32Driver())
+    region = board_table(LAYOUT).bounds()
 
-        try:
-            validate_board(board)
-        except:
-            print("BAD BOARD!!! I'm just gonna try a new game since I clearly messed that up.")
-            continue
-
-        with timer("Solving game"):
-            try:
-                solution = solve_game(board)
-            except UnsolveableBoardError:
-                print(":( game was unsolveable")
-                continue
-
-        board = ActiveBoard(board, layout)
-        for i, action in enumerate(solution):
-            action.do(board)
+    while True:
+        outcome = play_game(executor, get_screenshot, cache.solve, region, metrics)
+        record_outcome(metrics, outcome)
 
 
 if __name__ == "__main__":
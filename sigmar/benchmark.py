@@ -0,0 +1,335 @@
+import json
+import os
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+from sigmar.board import BitBoard, Board, deal_board
+from sigmar.route import InvalidSolutionError, check_solution
+from sigmar.solver import (
+    ACTION_FACTORIES,
+    DEFAULT_ORDERING,
+    MOVE_GENERATORS,
+    SearchBudgetExhausted,
+    SearchStats,
+    UnsolveableBoardError,
+    compare_move_generators,
+    opens_most_tiles,
+    saves_salt,
+    solve_game,
+    unblocks_next_metal,
+)
+
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+CORPORA = ("easy", "hard", "unsolveable")
+
+# how many random deals to play out when checking the move generators.
+MOVE_CHECK_DEALS = 100
+
+# how much slower or bigger than the baseline a measurement may be before it
+# counts as a regression. node counts are deterministic so any increase counts,
+# and each corpus has to come out solved or unsolveable exactly as before.
+TOLERANCE = 0.25
+
+# corpus timings this close to the baseline are scheduler noise whatever the
+# ratio. microbenchmarks run for microseconds and jitter well past TOLERANCE,
+# so they're only reported next to the baseline, never failed on.
+MIN_REGRESSION_SECONDS = 0.1
+
+# generous enough for every board in the corpora. hitting it is a regression.
+CORPUS_MAX_NODES = 200000
+
+
+def load_corpus(name):
+    with open(os.path.join(BENCHMARK_DIR, f"{name}.txt")) as f:
+        return [Board.loads(line) for line in f if line.strip() and not line.startswith("#")]
+
+
+def run_corpus(boards):
+    """Solve every board, measuring wall time, search rate and peak memory.
+    Solutions that don't actually clear their board count as invalid."""
+    result = {"boards": len(boards), "solved": 0, "unsolveable": 0, "gave up": 0, "invalid": 0, "nodes": 0}
+    start = time.perf_counter()
+    for board in boards:
+        stats = SearchStats()
+        try:
+            solution = solve_game(board, stats=stats, max_nodes=CORPUS_MAX_NODES)
+            result["solved"] += 1
+        except UnsolveableBoardError:
+            result["unsolveable"] += 1
+        except SearchBudgetExhausted:
+            result["gave up"] += 1
+        else:
+            try:
+                check_solution(board, solution)
+            except InvalidSolutionError:
+                result["invalid"] += 1
+        result["nodes"] += stats.nodes
+    result["seconds"] = time.perf_counter() - start
+    result["nodes per second"] = result["nodes"] / result["seconds"]
+
+    # tracing allocations slows everything down, so memory gets its own pass.
+    peak = 0
+    for board in boards:
+        tracemalloc.start()
+        try:
+            solve_game(board, max_nodes=CORPUS_MAX_NODES)
+        except (UnsolveableBoardError, SearchBudgetExhausted):
+            pass
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    result["peak memory kb"] = peak / 1024
+    return result
+
+
+def _microseconds_per_call(fn):
+    timer = timeit.Timer(fn)
+    number, seconds = timer.autorange()
+    return min([seconds] + timer.repeat(repeat=2, number=number)) / number * 1e6
+
+
+def run_microbenchmarks(board):
+    """Time the operations the search performs at every node."""
+    bitboard = BitBoard.from_board(board)
+    live = [h for h, el in board.tiles if el]
+    results = {
+        "Board.is_open": lambda: [board.is_open(h) for h in live],
+        "Board.clone": board.clone,
+        "Board.hash": lambda: hash(board),
+        "BitBoard.is_open": lambda: [bitboard.is_open(h) for h in live],
+        "BitBoard.clone": bitboard.clone,
+        "BitBoard.hash": lambda: hash(bitboard),
+        "BitBoard.open_tiles": lambda: dict(bitboard.open_tiles),
+    }
+
+    open_elements = dict(bitboard.open_tiles)
+    for action_factory in ACTION_FACTORIES:
+        results[action_factory.__name__] = lambda f=action_factory: list(f(bitboard, open_elements))
+    for name, generator in MOVE_GENERATORS:
+        results[f"{name} (moves)"] = lambda g=generator: g(bitboard, [])
+
+    return {name: _microseconds_per_call(fn) for name, fn in results.items()}
+
+
+def run_suite():
+    corpora = {name: load_corpus(name) for name in CORPORA}
+    return {
+        "corpora": {name: run_corpus(boards) for name, boards in corpora.items()},
+        "micro": run_microbenchmarks(corpora["hard"][0]),
+    }
+
+
+def find_regressions(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+
+    def compare(label, value, expected, allowance, floor=0):
+        if expected is not None and value > expected * (1 + allowance) and value - expected > floor:
+            regressions.append(f"{label}: {value:.1f} vs baseline {expected:.1f}")
+
+    def match(label, value, expected):
+        if expected is not None and value != expected:
+            regressions.append(f"{label}: {value} vs baseline {expected}")
+
+    for name, result in results["corpora"].items():
+        expected = baseline["corpora"].get(name, {})
+        match(f"{name} solved", result["solved"], expected.get("solved"))
+        match(f"{name} unsolveable", result["unsolveable"], expected.get("unsolveable"))
+        match(f"{name} invalid solutions", result["invalid"], 0)
+        compare(f"{name} nodes", result["nodes"], expected.get("nodes"), 0)
+        compare(f"{name} gave up", result["gave up"], expected.get("gave up"), 0)
+        compare(f"{name} seconds", result["seconds"], expected.get("seconds"), tolerance, MIN_REGRESSION_SECONDS)
+        compare(f"{name} peak memory kb", result["peak memory kb"], expected.get("peak memory kb"), tolerance)
+
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f"{'corpus':<14}{'boards':>7}{'solved':>7}{'unsolv.':>8}{'gave up':>8}{'invalid':>8}{'nodes':>9}"
+          f"{'seconds':>9}{'nodes/s':>9}{'peak kb':>9}")
+    for name, result in results["corpora"].items():
+        print(f"{name:<14}{result['boards']:>7}{result['solved']:>7}{result['unsolveable']:>8}"
+              f"{result['gave up']:>8}{result['invalid']:>8}{result['nodes']:>9}{result['seconds']:>9.3f}"
+              f"{result['nodes per second']:>9.0f}{result['peak memory kb']:>9.0f}")
+    print()
+    if baseline is None:
+        print(f"{'operation':<34}{'us/call':>10}")
+        for name, microseconds in results["micro"].items():
+            print(f"{name:<34}{microseconds:>10.2f}")
+        return
+
+    print(f"{'operation':<34}{'us/call':>10}{'baseline':>10}{'change':>9}")
+    for name, microseconds in results["micro"].items():
+        expected = baseline["micro"].get(name)
+        if expected is None:
+            print(f"{name:<34}{microseconds:>10.2f}")
+        else:
+            print(f"{name:<34}{microseconds:>10.2f}{expected:>10.2f}{microseconds / expected - 1:>+9.0%}")
+
+
+def find_move_mismatches(count=MOVE_CHECK_DEALS, seed=0):
+    """Check MOVE_GENERATORS against ACTION_FACTORIES along random playouts.
+
+    Each deal has random tiles taken off one at a time, open or not, so the
+    generators see plenty of positions a real search never would. Returns a
+    description of every position where they disagree.
+
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    for i in range(count):
+        bitboard = BitBoard.from_board(deal_board(rng))
+        step = 0
+        while bitboard.occupied:
+            for name in compare_move_generators(bitboard):
+                mismatches.append(f"deal {i} step {step} {bitboard.dumps()}: {name}")
+            bitboard.take(rng.choice([h for h, el in bitboard.tiles if el]))
+            step += 1
+    return mismatches
+
+
+def check_moves():
+    """Check the move generators still match ACTION_FACTORIES, exiting non-zero if not."""
+    mismatches = find_move_mismatches()
+    if mismatches:
+        print("MOVE GENERATORS DISAGREE WITH ACTION_FACTORIES:")
+        for mismatch in mismatches:
+            print(f"  {mismatch}")
+        sys.exit(1)
+    print(f"Move generators match ACTION_FACTORIES on {MOVE_CHECK_DEALS} random playouts.")
+
+
+def benchmark_suite():
+    """Check the move generators, then run the corpora and microbenchmarks and
+    compare them to the baseline."""
+    check_moves()
+    print()
+
+    results = run_suite()
+
+    if not os.path.exists(BASELINE_PATH):
+        print_results(results)
+        print("\nNo baseline to compare against. Record one with `python -m sigmar.benchmark baseline`.")
+        return
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    print_results(results, baseline)
+
+    regressions = find_regressions(results, baseline)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions against the baseline.")
+
+
+def record_baseline():
+    """Run the suite and save the results as the new baseline."""
+    results = run_suite()
+    print_results(results)
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nBaseline written to {BASELINE_PATH}.")
+
+
+ORDERINGS = {
+    "fixed": None,
+    "default": DEFAULT_ORDERING,
+    "opens-most-tiles": [opens_most_tiles],
+    "next-metal": [unblocks_next_metal, opens_most_tiles],
+    "salt-last": [saves_salt, opens_most_tiles],
+}
+
+
+def compare_orderings(boards, orderings, max_nodes=20000):
+    """Solve each board with each ordering and total up the search effort."""
+    results = {}
+    for name, ordering in orderings.items():
+        result = results[name] = {"solved": 0, "unsolveable": 0, "gave up": 0, "nodes": 0, "seconds": 0.0}
+        for board in boards:
+            stats = SearchStats()
+            start = time.time()
+            try:
+                solve_game(board, ordering=ordering, stats=stats, max_nodes=max_nodes)
+                result["solved"] += 1
+            except UnsolveableBoardError:
+                result["unsolveable"] += 1
+            except SearchBudgetExhausted:
+                result["gave up"] += 1
+            result["nodes"] += stats.nodes
+            result["seconds"] += time.time() - start
+    return results
+
+
+def benchmark_ordering():
+    """Compare search node counts for each move ordering over random deals."""
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rng = random.Random(0)
+    boards = [deal_board(rng) for i in range(count)]
+
+    results = compare_orderings(boards, ORDERINGS)
+    print(f"{'ordering':<18}{'solved':>8}{'unsolv.':>8}{'gave up':>8}{'nodes':>10}{'seconds':>9}")
+    for name, result in results.items():
+        print(f"{name:<18}{result['solved']:>8}{result['unsolveable']:>8}{result['gave up']:>8}"
+              f"{result['nodes']:>10}{result['seconds']:>9.2f}")
+
+
+def compare_parallel(boards, workers):
+    """Solve each board serially and with workers, totalling up the nodes each
+    way. Subtrees searched in different processes can't share dead states, so
+    the parallel search expands more nodes than the serial one."""
+    results = {}
+    for name, count in (("serial", None), (f"{workers} workers", workers)):
+        result = results[name] = {"solved": 0, "unsolveable": 0, "nodes": 0, "seconds": 0.0}
+        for board in boards:
+            stats = SearchStats()
+            start = time.time()
+            try:
+                solve_game(board, stats=stats, workers=count)
+                result["solved"] += 1
+            except UnsolveableBoardError:
+                result["unsolveable"] += 1
+            result["nodes"] += stats.nodes
+            result["seconds"] += time.time() - start
+    return results
+
+
+def benchmark_parallel():
+    """Compare the nodes a serial and a parallel search expand on each corpus."""
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(f"{'corpus':<14}{'search':<12}{'solved':>8}{'unsolv.':>8}{'nodes':>10}{'vs serial':>10}{'seconds':>9}")
+    for corpus in CORPORA:
+        results = compare_parallel(load_corpus(corpus), workers)
+        serial = results["serial"]["nodes"]
+        for name, result in results.items():
+            print(f"{corpus:<14}{name:<12}{result['solved']:>8}{result['unsolveable']:>8}{result['nodes']:>10}"
+                  f"{result['nodes'] / serial:>9.2f}x{result['seconds']:>9.2f}")
+
+
+def main():
+    commands = {
+        "suite": benchmark_suite,
+        "baseline": record_baseline,
+        "ordering": benchmark_ordering,
+        "parallel": benchmark_parallel,
+        "moves": check_moves,
+    }
+
+    try:
+        choice = sys.argv[1]
+        fn = commands[choice]
+    except (IndexError, KeyError):
+        print(f"USAGE: python -m sigmar.benchmark {{{','.join(commands.keys())}}}")
+        sys.exit(1)
+
+    fn()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import enum
-import itertools
+import random
 
 from sigmar.hex import Hex
 
@@ -44,21 +44,153 @@ Element.Metals = [
 ]
 
 
+# how many of each element a freshly dealt game has.
+DEAL_COUNTS = {
+    Element.AIR: 8,
+    Element.FIRE: 8,
+    Element.WATER: 8,
+    Element.EARTH: 8,
+    Element.SALT: 4,
+    Element.MORS: 4,
+    Element.VITAE: 4,
+    Element.LEAD: 1,
+    Element.TIN: 1,
+    Element.IRON: 1,
+    Element.COPPER: 1,
+    Element.SILVER: 1,
+    Element.GOLD: 1,
+    Element.QUICKSILVER: 5,
+}
+
+
+# the text format is one character per cell in Board.new() order.
+_LETTERS = {
+    Element.EMPTY: ".",
+    Element.AIR: "a",
+    Element.FIRE: "f",
+    Element.WATER: "w",
+    Element.EARTH: "e",
+    Element.SALT: "s",
+    Element.MORS: "m",
+    Element.VITAE: "v",
+    Element.LEAD: "L",
+    Element.TIN: "T",
+    Element.IRON: "I",
+    Element.COPPER: "C",
+    Element.SILVER: "S",
+    Element.GOLD: "G",
+    Element.QUICKSILVER: "Q",
+}
+_ELEMENTS_BY_LETTER = {letter: el for el, letter in _LETTERS.items()}
+
+
+def _generate_hexes(radius):
+    for q in range(-radius, radius+1):
+        r1 = max(-radius, -q - radius)
+        r2 = min(radius, -q + radius)
+
+        for r in range(r1, r2+1):
+            yield Hex.from_axial(q, r)
+
+
+# every cell on the board, in the order Board.new() lays them out. a cell's
+# position in this list is its bit in a BitBoard mask.
+_CELLS = list(_generate_hexes(radius=5))
+_CELL_INDEX = {h: i for i, h in enumerate(_CELLS)}
+_ELEMENTS = list(Element)
+_METALS = sorted(Element.Metals)
+
+# the six neighbors of each cell in Hex.neighbors() order, as hexes and as
+# cell indices (None where the neighbor falls off the edge of the board).
+_NEIGHBOR_HEXES = {h: tuple(h.neighbors()) for h in _CELLS}
+_NEIGHBORS = [tuple(_CELL_INDEX.get(n) for n in _NEIGHBOR_HEXES[h]) for h in _CELLS]
+
+
+def _run_masks(neighbors):
+    masks = []
+    for i in range(6):
+        mask = 0
+        for j in range(i, i+3):
+            neighbor = neighbors[j % 6]
+            if neighbor is not None:
+                mask |= 1 << neighbor
+        masks.append(mask)
+    return tuple(masks)
+
+
+# for each cell, a mask for each run of three consecutive neighbors (wrapping
+# around). a tile is open when every cell in at least one of its runs is
+# empty. cells off the edge of the board are always empty so they're left out.
+_RUN_MASKS = [_run_masks(neighbors) for neighbors in _NEIGHBORS]
+
+
+def _dumps(board):
+    return "".join(_LETTERS[el or Element.EMPTY] for h, el in board.tiles)
+
+
+def _parse_text(text):
+    letters = "".join(text.split())
+    if len(letters) != len(_CELLS):
+        raise ValueError(f"expected {len(_CELLS)} cells, got {len(letters)}")
+    try:
+        return [_ELEMENTS_BY_LETTER[letter] for letter in letters]
+    except KeyError as e:
+        raise ValueError(f"unknown element {e.args[0]!r}")
+
+
+def _to_bytes(board):
+    """Pack the board at four bits per cell, two cells to a byte."""
+    values = [el or Element.EMPTY for h, el in board.tiles] + [Element.EMPTY]
+    return bytes(values[i] << 4 | values[i+1] for i in range(0, len(_CELLS), 2))
+
+
+def _parse_bytes(data):
+    if len(data) != (len(_CELLS) + 1) // 2:
+        raise ValueError(f"expected {(len(_CELLS) + 1) // 2} bytes, got {len(data)}")
+    values = []
+    for byte in data:
+        values += [byte >> 4, byte & 0xF]
+    try:
+        return [Element(value) for value in values[:len(_CELLS)]]
+    except ValueError:
+        raise ValueError("unknown element in board data")
+
+
+def _from_elements(cls, elements):
+    board = cls.new()
+    for h, el in zip(_CELLS, elements):
+        if el:
+            board.set(h, el)
+    return board
+
+
+# a random 64-bit number per (cell, element). a board's zobrist key is the xor
+# of the numbers for every tile on it. the seed is fixed so keys are stable
+# across processes.
+_zobrist_random = random.Random(0x5167A2)
+_ZOBRIST = [[_zobrist_random.getrandbits(64) for el in Element] for h in _CELLS]
+
+
 class Board(object):
     center = Hex.from_axial(0, 0)
 
     @classmethod
     def new(cls):
-        tiles = {}
-        radius = 5
-        for q in range(-radius, radius+1):
-            r1 = max(-radius, -q - radius)
-            r2 = min(radius, -q + radius)
+        return cls({h: None for h in _CELLS})
 
-            for r in range(r1, r2+1):
-                h = Hex.from_axial(q, r)
-                tiles[h] = None
-        return cls(tiles)
+    @classmethod
+    def loads(cls, text):
+        return _from_elements(cls, _parse_text(text))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return _from_elements(cls, _parse_bytes(data))
+
+    def dumps(self):
+        return _dumps(self)
+
+    def to_bytes(self):
+        return _to_bytes(self)
 
     def __init__(self, tiles):
         self.board = tiles
@@ -88,13 +220,220 @@ class Board(object):
             yield h, self.board[h]
 
     def is_open(self, target):
-        neighbors = itertools.cycle((self.get(h) for h in target.neighbors()))
-        run_length = 0
-        for neighbor in itertools.islice(neighbors, 6+2):
-            if not neighbor:
-                run_length += 1
-                if run_length == 3:
-                    return True
+        empty = [not self.get(h) for h in _NEIGHBOR_HEXES[target]]
+        return any(empty[i-2] and empty[i-1] and empty[i] for i in range(6))
+
+
+class BitBoard(object):
+    """A compact Board that stores one bitmask of occupied cells per element.
+
+    Bit i of each mask refers to the i-th cell in Board.new() order. The set
+    of open tiles is kept up to date as tiles are placed and taken, so it
+    never has to be rebuilt from scratch.
+
+    """
+    center = Board.center
+    cells = _CELLS
+
+    @classmethod
+    def new(cls):
+        return cls([0] * len(Element))
+
+    @classmethod
+    def loads(cls, text):
+        return _from_elements(cls, _parse_text(text))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return _from_elements(cls, _parse_bytes(data))
+
+    def dumps(self):
+        return _dumps(self)
+
+    def to_bytes(self):
+        return _to_bytes(self)
+
+    @classmethod
+    def from_board(cls, board):
+        bitboard = cls.new()
+        for h, el in board.tiles:
+            if el:
+                bitboard.set(h, el)
+        return bitboard
+
+    def __init__(self, masks, open_mask=None, key=None):
+        self.masks = masks
+        self.occupied = 0
+        for mask in masks:
+            self.occupied |= mask
+
+        if key is None:
+            key = 0
+            for index, el in self._elements(self.occupied).items():
+                key ^= _ZOBRIST[index][el]
+        self.key = key
+
+        if open_mask is None:
+            open_mask = 0
+            for i in range(len(_CELLS)):
+                if self.occupied & (1 << i) and self._is_open_index(i):
+                    open_mask |= 1 << i
+        self.open_mask = open_mask
+        self.lowest_metal = self._find_lowest_metal()
+
+    def _find_lowest_metal(self):
+        for el in _METALS:
+            if self.masks[el]:
+                return el
+        return None
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def full_key(self):
+        """Return an exact encoding of the board, for checking key collisions."""
+        return b"".join(mask.to_bytes(12, "little") for mask in self.masks)
+
+    def _is_open_index(self, index):
+        occupied = self.occupied
+        for mask in _RUN_MASKS[index]:
+            if not occupied & mask:
+                return True
+        return False
+
+    def _update_open(self, index):
+        for i in (index,) + _NEIGHBORS[index]:
+            if i is None:
+                continue
+            bit = 1 << i
+            if self.occupied & bit and self._is_open_index(i):
+                self.open_mask |= bit
             else:
-                run_length = 0
+                self.open_mask &= ~bit
+
+    # set_index and take_index work on cell indices rather than hexes, for
+    # the search to make and unmake moves with.
+    def set_index(self, index, el):
+        bit = 1 << index
+        if self.occupied & bit:
+            self._remove(index, bit)
+        if el:
+            self.masks[el] |= bit
+            self.occupied |= bit
+            self.key ^= _ZOBRIST[index][el]
+            if el in _METALS and (self.lowest_metal is None or el < self.lowest_metal):
+                self.lowest_metal = el
+        self._update_open(index)
+
+    def take_index(self, index):
+        bit = 1 << index
+        if not self.occupied & bit:
+            return None
+        el = self._remove(index, bit)
+        self._update_open(index)
+        return el
+
+    def _remove(self, index, bit):
+        for i, mask in enumerate(self.masks):
+            if mask & bit:
+                self.masks[i] = mask & ~bit
+                self.key ^= _ZOBRIST[index][i]
+                break
+        self.occupied &= ~bit
+        if i == self.lowest_metal and not self.masks[i]:
+            self.lowest_metal = self._find_lowest_metal()
+        return _ELEMENTS[i]
+
+    def set(self, h, el):
+        assert el is None or isinstance(el, Element)
+        assert h in _CELL_INDEX
+        self.set_index(_CELL_INDEX[h], el)
+
+    def get(self, h):
+        index = _CELL_INDEX.get(h)
+        if index is None:
+            return None
+
+        bit = 1 << index
+        if not self.occupied & bit:
+            return None
+
+        for i, mask in enumerate(self.masks):
+            if mask & bit:
+                return _ELEMENTS[i]
+
+    def take(self, h):
+        assert h in _CELL_INDEX
+        return self.take_index(_CELL_INDEX[h])
+
+    def clone(self):
+        return BitBoard(self.masks[:], self.open_mask, self.key)
+
+    def _elements(self, within):
+        elements = {}
+        for i, mask in enumerate(self.masks):
+            mask &= within
+            while mask:
+                low_bit = mask & -mask
+                elements[low_bit.bit_length() - 1] = _ELEMENTS[i]
+                mask ^= low_bit
+        return elements
+
+    @property
+    def tiles(self):
+        elements = self._elements(self.occupied)
+        for i, h in enumerate(_CELLS):
+            yield h, elements.get(i)
+
+    @property
+    def open_tiles(self):
+        elements = self._elements(self.open_mask)
+        for i in sorted(elements):
+            yield _CELLS[i], elements[i]
+
+    def is_open(self, target):
+        return self._is_open_index(_CELL_INDEX[target])
+
+    @property
+    def open_count(self):
+        return bin(self.open_mask).count("1")
+
+    def count(self, el):
+        return bin(self.masks[el]).count("1")
+
+    def find(self, el):
+        mask = self.masks[el]
+        while mask:
+            low_bit = mask & -mask
+            yield _CELLS[low_bit.bit_length() - 1]
+            mask ^= low_bit
+
+    def could_open(self, target, blockers):
+        """Whether target could ever become open while the blocking tiles are
+        still on the board."""
+        blocking = 0
+        for h in blockers:
+            blocking |= 1 << _CELL_INDEX[h]
+        for mask in _RUN_MASKS[_CELL_INDEX[target]]:
+            if not blocking & mask:
+                return True
         return False
+
+
+def deal_board(rng=random):
+    """Deal a random board with exactly DEAL_COUNTS of each element.
+
+    Like the game, gold always goes in the center and everything else is
+    scattered over the remaining cells. Nothing guarantees the deal can be
+    solved.
+
+    """
+    elements = [el for el, count in DEAL_COUNTS.items() if el is not Element.GOLD for i in range(count)]
+    cells = [h for h in _CELLS if h != Board.center]
+    rng.shuffle(cells)
+
+    board = Board.new()
+    board.set(Board.center, Element.GOLD)
+    for h, el in zip(cells, elements):
+        board.set(h, el)
+    return board
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import time
+
+from sigmar.board import Board, Element
+from sigmar.hex import Hex
+from sigmar.solver import RemovePair, RemoveSingle, UnsolveableBoardError, solve_game
+
+
+_CELLS = [h for h, el in Board.new().tiles]
+
+
+def _symmetries():
+    """Yield the 12 rotations and reflections of the board as hex -> hex maps.
+
+    All of them keep neighbors adjacent and runs of neighbors consecutive, so
+    a tile is open on a transformed board exactly when it was on the original.
+
+    """
+    for reflect in (False, True):
+        for rotations in range(6):
+            mapping = {}
+            for h in _CELLS:
+                transformed = h.reflect() if reflect else h
+                for i in range(rotations):
+                    transformed = transformed.rotate_left()
+                mapping[h] = transformed
+            yield mapping
+
+
+_SYMMETRIES = list(_symmetries())
+_INVERSE_SYMMETRIES = [{v: k for k, v in mapping.items()} for mapping in _SYMMETRIES]
+
+
+def _encode(board, inverse):
+    tiles = dict(board.tiles)
+    return "".join(format(tiles[inverse[h]] or Element.EMPTY, "x") for h in _CELLS)
+
+
+def canonicalize(board):
+    """Return the canonical key for a board and the index of the symmetry that
+    maps the board onto it."""
+    return min((_encode(board, inverse), i) for i, inverse in enumerate(_INVERSE_SYMMETRIES))
+
+
+def _encode_solution(solution, mapping):
+    return json.dumps([[[mapping[h].q, mapping[h].r] for h in action.tiles] for action in solution])
+
+
+def _decode_solution(encoded, mapping):
+    solution = []
+    for tiles in json.loads(encoded):
+        hexes = [mapping[Hex.from_axial(q, r)] for q, r in tiles]
+        if len(hexes) == 1:
+            solution.append(RemoveSingle(*hexes))
+        else:
+            solution.append(RemovePair(*hexes))
+    return solution
+
+
+class SolutionCache(object):
+    """A size-bounded on-disk record of solved (and unsolveable) boards.
+
+    Boards are keyed by a canonical encoding under the board's rotations and
+    reflections, so any symmetric copy of a board already seen is a hit too.
+    Once the cache holds more than `max_entries` boards, the least recently
+    used ones are dropped.
+
+    """
+    def __init__(self, path="solutions.sqlite3", max_entries=100000):
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS solutions "
+                "(key TEXT PRIMARY KEY, solution TEXT, last_used REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)")
+
+    def __len__(self):
+        count, = self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()
+        return count
+
+    def get(self, board):
+        """Return the cached solution for the board or None if there isn't one.
+
+        Raises UnsolveableBoardError if the board is known to be unsolveable.
+
+        """
+        key, symmetry = canonicalize(board)
+        row = self.connection.execute("SELECT solution FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        with self.connection:
+            self.connection.execute("UPDATE solutions SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        encoded, = row
+        if encoded is None:
+            raise UnsolveableBoardError
+        return _decode_solution(encoded, _INVERSE_SYMMETRIES[symmetry])
+
+    def put(self, board, solution):
+        """Remember a board's solution, or that it has none if solution is None."""
+        key, symmetry = canonicalize(board)
+        encoded = None
+        if solution is not None:
+            encoded = _encode_solution(solution, _SYMMETRIES[symmetry])
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO solutions (key, solution, last_used) VALUES (?, ?, ?)",
+                (key, encoded, time.time()))
+            self.connection.execute(
+                "DELETE FROM solutions WHERE key IN "
+                "(SELECT key FROM solutions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+    def solve(self, board, **kwargs):
+        """Look the board up, falling back to solve_game and caching its answer.
+
+        Running out of search budget isn't cached since a later attempt with a
+        bigger budget might still succeed.
+
+        """
+        solution = self.get(board)
+        if solution is not None:
+            return solution
+
+        try:
+            solution = solve_game(board, **kwargs)
+        except UnsolveableBoardError:
+            self.put(board, None)
+            raise
+        self.put(board, solution)
+        return solution
+
+    def close(self):
+        self.connection.close()
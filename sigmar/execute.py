@@ -0,0 +1,168 @@
+import collections
+
+import PIL.Image
+import PIL.ImageChops
+
+
+# how long to hold the button down for each click and wait between clicks,
+# how often to look at the board while waiting for a new game to be dealt,
+# how many looks in a row have to match before the deal counts as finished,
+# and how long to wait for it at most. all in seconds except settle_polls.
+Timing = collections.namedtuple("Timing", "hold gap poll_interval settle_polls new_game_timeout")
+
+DEFAULT_TIMING = Timing(hold=0.03, gap=0.03, poll_interval=0.2, settle_polls=3, new_game_timeout=10)
+
+# how far apart two pixels can be and still count as unchanged between polls,
+# so compression and the marbles' idle shimmer don't look like a deal.
+CHANGE_THRESHOLD = 24
+
+# where to leave the cursor while the board is dealt and read: inside the
+# window but clear of the board. never (0, 0), since a window at the screen's
+# corner would put the cursor on pyautogui's fail-safe and stop the next click.
+REST_POINT = (100, 100)
+
+
+class InputDriver(object):
+    """Where the clicks go and the pixels come from.
+
+    Coordinates are relative to the game window's client area.
+
+    """
+    def attach(self):
+        """Find the game window and bring it to the front."""
+        raise NotImplementedError
+
+    def find_new_game_button(self):
+        """Return the center of the new game button."""
+        raise NotImplementedError
+
+    def click(self, x, y, hold):
+        raise NotImplementedError
+
+    def new_game_clicked(self):
+        """Called right after the new game button has been clicked."""
+        pass
+
+    def move(self, x, y):
+        raise NotImplementedError
+
+    def grab(self, box):
+        """Return an image of the (left, top, right, bottom) box of the window."""
+        raise NotImplementedError
+
+    def sleep(self, seconds):
+        raise NotImplementedError
+
+    def clock(self):
+        raise NotImplementedError
+
+
+class RecordingDriver(InputDriver):
+    """A stand-in driver that writes down what it was asked to do.
+
+    Sleeping only advances a virtual clock, so a run takes no real time and
+    the clock says how long it would have taken. grab hands back the given
+    frames in turn, repeating the last one once they run out.
+
+    """
+    def __init__(self, frames=(), new_game_button=(0, 0)):
+        self.frames = list(frames)
+        self.new_game_button = new_game_button
+        self.elapsed = 0.0
+        self.events = []
+
+    def _record(self, *event):
+        self.events.append((self.elapsed,) + event)
+
+    def attach(self):
+        self._record("attach")
+
+    def find_new_game_button(self):
+        return self.new_game_button
+
+    def click(self, x, y, hold):
+        self._record("click", x, y)
+        self.elapsed += hold
+
+    def move(self, x, y):
+        self._record("move", x, y)
+
+    def grab(self, box):
+        self._record("grab", box)
+        if not self.frames:
+            left, top, right, bottom = box
+            return PIL.Image.new("RGB", (right - left, bottom - top))
+        frame = self.frames.pop(0) if len(self.frames) > 1 else self.frames[0]
+        return frame.crop(box)
+
+    def sleep(self, seconds):
+        self.elapsed += seconds
+
+    def clock(self):
+        return self.elapsed
+
+    @property
+    def clicks(self):
+        return [event[2:] for event in self.events if event[1] == "click"]
+
+
+def _differs(a, b):
+    difference = PIL.ImageChops.difference(a.convert("L"), b.convert("L"))
+    return difference.point(lambda v: 255 if v > CHANGE_THRESHOLD else 0).getbbox() is not None
+
+
+class Executor(object):
+    """Plays games through an InputDriver."""
+
+    def __init__(self, driver, timing=DEFAULT_TIMING, rest=REST_POINT):
+        self.driver = driver
+        self.timing = timing
+        self.rest = rest
+
+    def new_game(self, region):
+        """Start a new game and wait for the deal to finish.
+
+        region is the (left, top, right, bottom) box the board is dealt into.
+        It is watched until it has changed from the old board and then held
+        still for timing.settle_polls looks in a row. Returns whether that
+        happened before timing.new_game_timeout ran out.
+
+        """
+        driver = self.driver
+        timing = self.timing
+
+        driver.attach()
+        x, y = driver.find_new_game_button()
+        old = driver.grab(region)
+        driver.click(x, y, timing.hold)
+        driver.new_game_clicked()
+        # keep the cursor from hovering over anything while the board is read
+        driver.move(*self.rest)
+
+        deadline = driver.clock() + timing.new_game_timeout
+        previous = old
+        dealt = False
+        still = 0
+        while driver.clock() < deadline:
+            driver.sleep(timing.poll_interval)
+            image = driver.grab(region)
+            if not dealt:
+                dealt = _differs(image, old)
+            elif _differs(image, previous):
+                still = 0
+            else:
+                still += 1
+                if still >= timing.settle_polls:
+                    return True
+            previous = image
+        return False
+
+    def play(self, clicks):
+        """Click each of the (x, y) points in turn, in the window new_game found."""
+        driver = self.driver
+        timing = self.timing
+
+        for x, y in clicks:
+            driver.click(x, y, timing.hold)
+            driver.sleep(timing.gap)
+        driver.move(*self.rest)
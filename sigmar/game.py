@@ -0,0 +1,97 @@
+import collections
+import time
+
+from sigmar.board import DEAL_COUNTS
+from sigmar.hex import Point
+from sigmar.route import plan_route
+from sigmar.solver import SearchBudgetExhausted, SearchStats, UnsolveableBoardError
+from sigmar.vision import board_table, detect_board
+from sigmar.vision.repair import BoardRepairError, repair_board
+
+
+OUTCOMES = ("solved", "bad board", "unsolveable", "gave up")
+
+# dealing a new game is cheaper than grinding on a pathological board.
+SOLVE_TIME_LIMIT = 10
+
+
+def validate_board(board):
+    elements = collections.Counter()
+    for h, el in board.tiles:
+        elements[el] += 1
+
+    for el, count in DEAL_COUNTS.items():
+        assert elements[el] == count
+
+
+def play_game(executor, take_screenshot, solve, region, metrics, log=print):
+    """Deal a game, read it, solve it and click out the solution.
+
+    Each step is timed as a stage in metrics, along with how much searching
+    the solver did. Returns how the game went: "solved", "bad board",
+    "unsolveable" or "gave up".
+
+    """
+    stage = metrics.stage
+
+    with stage("Waiting for new game"):
+        if not executor.new_game(region):
+            log("the board never settled, reading it anyway")
+
+    with stage("Taking screenshot"):
+        image = take_screenshot()
+
+    with stage("Reading board"):
+        board, layout, probabilities = detect_board(image, with_probabilities=True)
+
+    with stage("Validating board"):
+        try:
+            validate_board(board)
+        except AssertionError:
+            try:
+                board, changed = repair_board(probabilities)
+            except BoardRepairError as e:
+                log(f"BAD BOARD!!! {e}, so I'm just gonna try a new game.")
+                return "bad board"
+            log(f"Board was a bit off, relabeled {len(changed)} tiles to make it legit.")
+            metrics.increment("repaired_tiles_total", len(changed))
+        else:
+            log("Board looks legit!")
+
+    stats = SearchStats()
+    with stage("Solving game"):
+        try:
+            solution = solve(board, time_limit=SOLVE_TIME_LIMIT, stats=stats)
+        except UnsolveableBoardError:
+            log(":( game was unsolveable")
+            return "unsolveable"
+        except SearchBudgetExhausted as e:
+            log(f":| {e}, trying another game")
+            return "gave up"
+        finally:
+            metrics.increment("solver_nodes_total", stats.nodes)
+            metrics.increment("solver_seconds_total", stats.seconds)
+
+    with stage("Planning clicks"):
+        # new_game left the cursor resting at executor.rest
+        solution, before, after = plan_route(board, solution, layout, start=Point(*executor.rest))
+    log(f"Cursor travel cut from {before:.0f}px to {after:.0f}px")
+
+    table = board_table(layout)
+    with stage("Executing solution"):
+        executor.play([table.hex_to_pixel(h) for action in solution for h in action.tiles])
+    return "solved"
+
+
+def record_outcome(metrics, outcome):
+    """Count a finished game and bring the derived rates up to date."""
+    metrics.increment("games_total", outcome=outcome)
+
+    games = metrics.total("games_total")
+    for name in OUTCOMES:
+        metrics.set("outcome_ratio", metrics.get("games_total", outcome=name) / games, outcome=name)
+    metrics.set("games_per_minute", games / (time.time() - metrics.started) * 60)
+
+    solver_seconds = metrics.get("solver_seconds_total")
+    if solver_seconds:
+        metrics.set("solver_nodes_per_second", metrics.get("solver_nodes_total") / solver_seconds)
@@ -27,6 +27,9 @@ class Hex(collections.namedtuple("Hex", ["q", "r", "s"])):
     def rotate_right(self):
         return Hex(-self.r, -self.s, -self.q)
 
+    def reflect(self):
+        return Hex(self.q, self.s, self.r)
+
     def neighbor(self, direction):
         return self + _HEX_DIRECTIONS[direction]
 
@@ -76,3 +79,90 @@ class Layout(collections.namedtuple("Layout", ["orientation", "size", "origin"])
             offset = self.hex_corner_offset(i)
             corners.append(Point(center.x + offset.x, center.y + offset.y))
         return corners
+
+    # array versions of the above for working on many hexes at once. numpy
+    # is imported lazily so the solver can use this module without it.
+    def hexes_to_pixels(self, q, r):
+        """Return the pixel centers of the hexes with axial coordinates q, r as an (n, 2) array."""
+        import numpy
+        M = self.orientation
+        size = self.size
+        origin = self.origin
+        q = numpy.asarray(q, dtype="float64")
+        r = numpy.asarray(r, dtype="float64")
+        x = (M.f0 * q + M.f1 * r) * size.x
+        y = (M.f2 * q + M.f3 * r) * size.y
+        return numpy.stack([x + origin.x, y + origin.y], axis=-1)
+
+    def corner_offsets(self):
+        """Return the offsets of all six corners as a (6, 2) array."""
+        import numpy
+        M = self.orientation
+        size = self.size
+        angles = 2.0 * numpy.pi * (M.start_angle - numpy.arange(6)) / 6
+        return numpy.stack([size.x * numpy.cos(angles), size.y * numpy.sin(angles)], axis=-1)
+
+    def polygons_corners(self, q, r):
+        """Return the corners of the hexes with axial coordinates q, r as an (n, 6, 2) array."""
+        return self.hexes_to_pixels(q, r)[:, None, :] + self.corner_offsets()
+
+
+class HexTable(object):
+    """Pixel geometry for a fixed set of hexes under one layout, computed in bulk."""
+
+    def __init__(self, layout, hexes):
+        self.layout = layout
+        self.hexes = tuple(hexes)
+        self.index = {h: i for i, h in enumerate(self.hexes)}
+
+        q = [h.q for h in self.hexes]
+        r = [h.r for h in self.hexes]
+        self.centers = layout.hexes_to_pixels(q, r)
+        self.corners = layout.polygons_corners(q, r)
+        self._points = [Point(float(x), float(y)) for x, y in self.centers]
+        self._inner_boxes = {}
+
+    def hex_to_pixel(self, h):
+        return self._points[self.index[h]]
+
+    def bounds(self):
+        """Return the (left, top, right, bottom) box around all of the hexes."""
+        left, top = self.corners.min(axis=(0, 1))
+        right, bottom = self.corners.max(axis=(0, 1))
+        return int(left), int(top), int(right) + 1, int(bottom) + 1
+
+    def inner_boxes(self, inset_x=0, inset_y=0):
+        """Return the (left, top, right, bottom) box between corners 3 and 0 of each hex.
+
+        For pointy hexes that's the largest upright rectangle inside the hex.
+        The box is shrunk by the insets on each side and rounded to whole
+        pixels the same way PIL's Image.crop rounds. Boxes are computed once
+        per inset and kept with the table.
+
+        """
+        key = (inset_x, inset_y)
+        if key not in self._inner_boxes:
+            self._inner_boxes[key] = self._compute_inner_boxes(inset_x, inset_y)
+        return self._inner_boxes[key]
+
+    def _compute_inner_boxes(self, inset_x, inset_y):
+        import numpy
+        first = self.corners[:, 3]
+        second = self.corners[:, 0]
+        left = numpy.minimum(first[:, 0], second[:, 0]) + inset_x
+        top = numpy.minimum(first[:, 1], second[:, 1]) + inset_y
+        right = numpy.maximum(first[:, 0], second[:, 0]) - inset_x
+        bottom = numpy.maximum(first[:, 1], second[:, 1]) - inset_y
+        boxes = numpy.rint(numpy.stack([left, top, right, bottom], axis=-1)).astype(int)
+        return [tuple(int(v) for v in box) for box in boxes]
+
+
+_TABLES = {}
+
+
+def get_table(layout, hexes):
+    """Return the HexTable for hexes under layout, building it the first time it's asked for."""
+    key = (layout, tuple(hexes))
+    if key not in _TABLES:
+        _TABLES[key] = HexTable(layout, hexes)
+    return _TABLES[key]
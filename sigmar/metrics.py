@@ -0,0 +1,174 @@
+import bisect
+import contextlib
+import http.server
+import json
+import threading
+import time
+
+
+# upper bounds, in seconds, of the latency histogram buckets. they run from
+# reading a board (tens of milliseconds) up to a solve hitting its time limit.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _metric_name(name, labels):
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{value}"' for key, value in labels)
+    return f"{name}{{{rendered}}}"
+
+
+class Histogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """Yield (upper bound, observations at or under it) like Prometheus does."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in self.cumulative()},
+        }
+
+
+class Metrics(object):
+    """Counters, gauges and latency histograms for a long run of games.
+
+    Each metric is identified by a name plus optional labels, as in
+    increment("games_total", outcome="solved"). Updating a metric is a dict
+    lookup and some arithmetic under a lock, cheap enough to leave on all the
+    time. With echo, stage() also prints each stage as it runs.
+
+    """
+    def __init__(self, echo=False):
+        self.echo = echo
+        self.started = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def get(self, name, **labels):
+        """Return a counter's value, or 0 if it was never incremented."""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def total(self, name):
+        """Return the sum of a counter over all of its labels."""
+        with self.lock:
+            return sum(value for (key, labels), value in self.counters.items() if key == name)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the body as one run of the named stage."""
+        if self.echo:
+            print(f"{name}...", end="", flush=True)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=name)
+            if self.echo:
+                print(f"done (took {elapsed:0.3f}s)")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "counters": {_metric_name(*key): value for key, value in self.counters.items()},
+                "gauges": {_metric_name(*key): value for key, value in self.gauges.items()},
+                "histograms": {_metric_name(*key): histogram.as_dict() for key, histogram in self.histograms.items()},
+            }
+
+    def prometheus_text(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"sigmar_{_metric_name(name, labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f"sigmar_{_metric_name(name, labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    lines.append(f"sigmar_{_metric_name(name + '_bucket', labels + (('le', le),))} {count}")
+                lines.append(f"sigmar_{_metric_name(name + '_sum', labels)} {histogram.sum}")
+                lines.append(f"sigmar_{_metric_name(name + '_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def write_snapshot(metrics, path):
+    with open(path, "a") as f:
+        f.write(json.dumps(metrics.snapshot()) + "\n")
+
+
+def flush_periodically(metrics, path, interval=60):
+    """Append a JSON snapshot of metrics to path every interval seconds from a
+    background thread. Returns an Event that stops it once set."""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            write_snapshot(metrics, path)
+
+    threading.Thread(target=run, daemon=True).start()
+    return stopped
+
+
+def serve_prometheus(metrics, port, host="127.0.0.1"):
+    """Serve metrics for Prometheus to scrape at http://host:port/metrics from
+    a background thread. Returns the server; call shutdown() to stop it."""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.HTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
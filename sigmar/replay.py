@@ -0,0 +1,153 @@
+"""Replay recorded screenshots through the game loop off Windows.
+
+Each screenshot in the directory is played as one game: it's read, solved
+and "clicked" exactly like a live game, except the screenshots come from disk
+and the clicks go to a recording driver. Prints how long each stage took and
+how many games a minute that works out to.
+
+"""
+import argparse
+import collections
+import json
+import math
+import os
+import time
+
+import PIL.Image
+
+from sigmar.execute import Executor, RecordingDriver
+from sigmar.game import play_game, record_outcome
+from sigmar.metrics import Metrics
+from sigmar.solver import solve_game
+from sigmar.vision import LAYOUT, board_table, warm_up
+
+
+SCREENSHOT_EXTENSIONS = (".png", ".bmp", ".jpg", ".jpeg")
+
+
+class ReplayDriver(RecordingDriver):
+    """A recording driver that shows the screenshots one after another,
+    moving on to the next whenever the new game button is clicked.
+
+    The window goes blank between games, so each deal shows up as a change
+    even when the same screenshot is played twice in a row.
+
+    """
+    def __init__(self, paths):
+        super(ReplayDriver, self).__init__()
+        self.paths = list(paths)
+        self.image = None
+
+    def attach(self):
+        super(ReplayDriver, self).attach()
+        self.image = None
+
+    def new_game_clicked(self):
+        self.image = PIL.Image.open(self.paths.pop(0)).convert("RGB")
+
+    def grab(self, box):
+        self._record("grab", box)
+        if self.image is None:
+            left, top, right, bottom = box
+            return PIL.Image.new("RGB", (right - left, bottom - top))
+        return self.image.crop(box)
+
+    def screenshot(self):
+        return self.image
+
+
+class ReplayMetrics(Metrics):
+    """Metrics that also keep every stage timing, for exact percentiles."""
+
+    def __init__(self):
+        super(ReplayMetrics, self).__init__()
+        self.stage_seconds = collections.defaultdict(list)
+
+    def observe(self, name, value, **labels):
+        super(ReplayMetrics, self).observe(name, value, **labels)
+        if name == "stage_seconds":
+            self.stage_seconds[labels["stage"]].append(value)
+
+
+def percentile(values, p):
+    """Return the nearest-rank p-th percentile of values."""
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def find_screenshots(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(SCREENSHOT_EXTENSIONS))
+
+
+def replay(paths, repeat=1):
+    """Play every screenshot repeat times and return a summary of the run."""
+    paths = list(paths) * repeat
+    driver = ReplayDriver(paths)
+    executor = Executor(driver)
+    region = board_table(LAYOUT).bounds()
+    metrics = ReplayMetrics()
+    outcomes = collections.Counter()
+
+    start = time.perf_counter()
+    for path in paths:
+        outcome = play_game(executor, driver.screenshot, solve_game, region, metrics, log=lambda message: None)
+        record_outcome(metrics, outcome)
+        outcomes[outcome] += 1
+    seconds = time.perf_counter() - start
+
+    games = len(paths)
+    return {
+        "games": games,
+        "outcomes": dict(outcomes),
+        "seconds": seconds,
+        "simulated input seconds": driver.elapsed,
+        "games per minute": games / seconds * 60 if seconds else 0,
+        "games per minute with input": games / (seconds + driver.elapsed) * 60 if games else 0,
+        "solver nodes per second": metrics.gauges.get(("solver_nodes_per_second", ()), 0),
+        "stages": {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values),
+            }
+            for name, values in metrics.stage_seconds.items()
+        },
+    }
+
+
+def print_summary(summary):
+    print(f"{'stage':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, stage in summary["stages"].items():
+        print(f"{name:<24}{stage['count']:>7}{stage['p50'] * 1000:>10.1f}"
+              f"{stage['p95'] * 1000:>10.1f}{stage['max'] * 1000:>10.1f}")
+    print()
+    outcomes = ", ".join(f"{count} {outcome}" for outcome, count in sorted(summary["outcomes"].items()))
+    print(f"{summary['games']} games ({outcomes}) in {summary['seconds']:.2f}s")
+    print(f"{summary['games per minute']:.1f} games/minute, "
+          f"{summary['games per minute with input']:.1f} counting simulated clicks and waits")
+    print(f"solver searched {summary['solver nodes per second']:.0f} nodes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m sigmar.replay", description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory of recorded screenshots of freshly dealt games")
+    parser.add_argument("--repeat", type=int, default=1, help="play each screenshot this many times")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    paths = find_screenshots(args.directory)
+    if not paths:
+        parser.error(f"no screenshots found in {args.directory}")
+
+    warm_up()
+    summary = replay(paths, args.repeat)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
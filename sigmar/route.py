@@ -0,0 +1,166 @@
+import math
+
+from sigmar.board import BitBoard, Element
+from sigmar.solver import RemovePair, RemoveSingle
+
+
+# the solver only cares which removals happen, not in what order the mouse
+# gets to them. any order works as long as every tile is open when it's
+# clicked and metals go lowest first, so the solution can be reshuffled to
+# keep the cursor from zig-zagging across the board.
+#
+# that always leaves at least one way forward: whichever remaining action
+# came first in the original solution has had everything it depended on
+# removed already.
+
+_METALS = sorted(Element.Metals)
+
+# how many times to sweep over the route trying to move single actions
+# somewhere cheaper before settling for what we've got.
+MAX_IMPROVEMENT_PASSES = 10
+
+
+class InvalidSolutionError(Exception):
+    pass
+
+
+def check_solution(board, solution):
+    """Raise InvalidSolutionError unless playing solution in order clears the board."""
+    board = board.clone()
+    for i, action in enumerate(solution):
+        live_metals = [el for h, el in board.tiles if el in Element.Metals]
+        for h in action.tiles:
+            el = board.get(h)
+            if el is None or not board.is_open(h):
+                raise InvalidSolutionError(f"move {i} takes {h}, which isn't open")
+            if el in Element.Metals and el is not min(live_metals):
+                raise InvalidSolutionError(f"move {i} takes {el.name} before {min(live_metals).name}")
+        action.do(board)
+
+    if any(el for h, el in board.tiles):
+        raise InvalidSolutionError("solution leaves tiles on the board")
+
+
+def _is_legal(board, action):
+    for h in action.tiles:
+        el = board.get(h)
+        if el is None or not board.is_open(h):
+            return False
+        if el in _METALS and el is not board.lowest_metal:
+            return False
+    return True
+
+
+def _is_valid(board, actions, order):
+    board = board.clone()
+    for i in order:
+        if not _is_legal(board, actions[i]):
+            return False
+        actions[i].do(board)
+    return True
+
+
+def _distance(a, b):
+    return math.hypot(a.x - b.x, a.y - b.y)
+
+
+def _orient(cursor, tiles):
+    """Put the nearer tile of a pair first."""
+    if cursor is not None and len(tiles) == 2 and _distance(cursor, tiles[1]) < _distance(cursor, tiles[0]):
+        return tiles[::-1]
+    return tiles
+
+
+def _travel(points, order, start, orient=True):
+    """How far the cursor moves clicking the actions in order."""
+    total = 0.0
+    cursor = start
+    for i in order:
+        tiles = _orient(cursor, points[i]) if orient else points[i]
+        for point in tiles:
+            if cursor is not None:
+                total += _distance(cursor, point)
+            cursor = point
+    return total
+
+
+def _nearest_neighbor(board, actions, points, start):
+    board = board.clone()
+    remaining = list(range(len(actions)))
+    order = []
+    cursor = start
+    while remaining:
+        best = None
+        for i in remaining:
+            if not _is_legal(board, actions[i]):
+                continue
+            cost = _distance(cursor, _orient(cursor, points[i])[0]) if cursor is not None else 0
+            if best is None or cost < best[0]:
+                best = (cost, i)
+
+        i = best[1]
+        actions[i].do(board)
+        remaining.remove(i)
+        order.append(i)
+        cursor = _orient(cursor, points[i])[-1]
+    return order
+
+
+def _improve(board, actions, points, start, order):
+    """Move single actions anywhere else in the route that cuts down on
+    travel, as long as the route stays playable."""
+    best = _travel(points, order, start)
+    for _ in range(MAX_IMPROVEMENT_PASSES):
+        improved = False
+        for i in range(len(order)):
+            rest = order[:i] + order[i+1:]
+            for j in range(len(order)):
+                if j == i:
+                    continue
+                candidate = rest[:j] + [order[i]] + rest[j:]
+                cost = _travel(points, candidate, start)
+                if cost < best - 1e-6 and _is_valid(board, actions, candidate):
+                    order, best = candidate, cost
+                    improved = True
+                    break
+        if not improved:
+            break
+    return order
+
+
+def plan_route(board, solution, layout, start=None):
+    """Reorder a solution so the cursor travels as little as possible.
+
+    start is where the cursor is before the first click, if known. Returns
+    the reordered solution, whose pairs list their tiles in the order they
+    should be clicked, along with the distance in pixels the cursor travels
+    for the original and the reordered solution.
+
+    """
+    actions = list(solution)
+    points = [tuple(layout.hex_to_pixel(h) for h in action.tiles) for action in actions]
+    bitboard = BitBoard.from_board(board)
+
+    original = list(range(len(actions)))
+    before = _travel(points, original, start, orient=False)
+
+    order = _nearest_neighbor(bitboard, actions, points, start)
+    if _travel(points, original, start) < _travel(points, order, start):
+        order = original
+    order = _improve(bitboard, actions, points, start, order)
+    after = _travel(points, order, start)
+
+    route = []
+    cursor = start
+    for i in order:
+        tiles = actions[i].tiles
+        if len(tiles) == 2:
+            if _orient(cursor, points[i]) is not points[i]:
+                tiles = tiles[::-1]
+            route.append(RemovePair(*tiles))
+        else:
+            route.append(RemoveSingle(*tiles))
+        cursor = _orient(cursor, points[i])[-1]
+
+    check_solution(board, route)
+    return route, before, after
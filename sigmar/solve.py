@@ -0,0 +1,89 @@
+"""Solve boards in bulk without the game client.
+
+Reads one board per line in the Board.dumps() text format from the given
+files (or stdin), solves them across a pool of processes and writes one JSON
+object per board to stdout as soon as each finishes.
+
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+from sigmar.board import BitBoard
+from sigmar.solver import SearchBudgetExhausted, SearchStats, UnsolveableBoardError, solve_game
+
+
+def _read_boards(files):
+    for f in files:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def solve_line(index, text, time_limit=None, max_nodes=None):
+    result = {"index": index, "board": text}
+    try:
+        board = BitBoard.loads(text)
+    except ValueError as e:
+        result.update(result="invalid", error=str(e))
+        return result
+
+    stats = SearchStats()
+    start = time.time()
+    try:
+        solution = solve_game(board, stats=stats, time_limit=time_limit, max_nodes=max_nodes)
+    except UnsolveableBoardError:
+        result["result"] = "unsolveable"
+    except SearchBudgetExhausted:
+        result["result"] = "gave up"
+    else:
+        result["result"] = "solved"
+        result["solution"] = [[[h.q, h.r] for h in action.tiles] for action in solution]
+
+    result["seconds"] = round(time.time() - start, 6)
+    result["nodes"] = stats.nodes
+    result["stats"] = stats.as_dict()
+    return result
+
+
+def solve_boards(boards, workers=None, time_limit=None, max_nodes=None):
+    """Solve the boards in a process pool, yielding results as they finish.
+
+    Only a couple of boards per worker are read ahead of the results, so an
+    endless stream of boards can be piped through.
+
+    """
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for index, text in enumerate(boards):
+            pending.add(pool.submit(solve_line, index, text, time_limit, max_nodes))
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m sigmar.solve", description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", type=argparse.FileType("r"), default=[sys.stdin],
+                        help="files of boards, one per line (default: stdin)")
+    parser.add_argument("-j", "--workers", type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--time-limit", type=float, help="give up on a board after this many seconds")
+    parser.add_argument("--max-nodes", type=int, help="give up on a board after expanding this many nodes")
+    args = parser.parse_args()
+
+    boards = _read_boards(args.files)
+    for result in solve_boards(boards, args.workers, args.time_limit, args.max_nodes):
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
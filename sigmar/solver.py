@@ -1,11 +1,21 @@
+import collections
+import concurrent.futures
 import logging
 import itertools
+import multiprocessing
+import time
 
-from sigmar.board import Element
+from sigmar.board import BitBoard, Element
+from sigmar.transposition import TranspositionTable
 
 
 class Action(object):
     def do(self, board):
+        """Apply the action to the board."""
+        raise NotImplementedError
+
+    @property
+    def tiles(self):
         raise NotImplementedError
 
 
@@ -13,6 +23,10 @@ class RemoveSingle(Action):
     def __init__(self, h):
         self.h = h
 
+    @property
+    def tiles(self):
+        return (self.h,)
+
     def do(self, board):
         board.take(self.h)
 
@@ -22,6 +36,10 @@ class RemovePair(Action):
         self.h1 = h1
         self.h2 = h2
 
+    @property
+    def tiles(self):
+        return (self.h1, self.h2)
+
     def do(self, board):
         board.take(self.h1)
         board.take(self.h2)
@@ -79,34 +97,588 @@ ACTION_FACTORIES = [
 ]
 
 
+# the search doesn't build Actions for every candidate. it works with moves
+# encoded as ints, first << 7 | second for a pair of cell indices or
+# index << 7 | index for a single tile, and generates them straight from the
+# board's masks. the move generators below yield exactly what the matching
+# ACTION_FACTORIES would, in the same order, and moves are only turned into
+# Actions for the solution that gets returned. `python -m sigmar.benchmark
+# moves` (also run by the benchmark suite) checks the two still agree.
+_CARDINALS = sorted(Element.Cardinals)
+
+
+def _bits(mask):
+    indices = []
+    while mask:
+        low_bit = mask & -mask
+        indices.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return indices
+
+
+def _metal_moves(board, moves):
+    metal = board.lowest_metal
+    if metal is None:
+        return
+
+    # like find_metals, a doubled metal resolves to its last cell
+    index = board.masks[metal].bit_length() - 1
+    if not board.open_mask >> index & 1:
+        return
+
+    if metal is Element.GOLD:
+        moves.append(index << 7 | index)
+    else:
+        for other in _bits(board.masks[Element.QUICKSILVER] & board.open_mask):
+            moves.append(index << 7 | other)
+
+
+def _mors_vitae_moves(board, moves):
+    vitae = _bits(board.masks[Element.VITAE] & board.open_mask)
+    if vitae:
+        for first in _bits(board.masks[Element.MORS] & board.open_mask):
+            for second in vitae:
+                moves.append(first << 7 | second)
+
+
+def _pair_moves(board, moves):
+    open_mask = board.open_mask
+    pairs = []
+    for el in _CARDINALS:
+        for first, second in itertools.combinations(_bits(board.masks[el] & open_mask), 2):
+            pairs.append(first << 7 | second)
+    # pairs of different cardinals interleave in cell order
+    pairs.sort()
+    moves.extend(pairs)
+
+    for first, second in itertools.combinations(_bits(board.masks[Element.SALT] & open_mask), 2):
+        moves.append(first << 7 | second)
+
+
+def _cardinal_salt_moves(board, moves):
+    masks = board.masks
+    open_mask = board.open_mask
+    salts = masks[Element.SALT] & open_mask
+    if not salts:
+        return
+
+    cardinals = (masks[Element.AIR] | masks[Element.FIRE] | masks[Element.WATER] | masks[Element.EARTH]) & open_mask
+    # as in match_cardinal_with_salt, only salts after the cardinal count
+    for first in _bits(cardinals):
+        for second in _bits(salts >> (first + 1)):
+            moves.append(first << 7 | first + 1 + second)
+
+
+MOVE_GENERATORS = [
+    (find_metals.__name__, _metal_moves),
+    (match_mors_vitae.__name__, _mors_vitae_moves),
+    (match_pairs.__name__, _pair_moves),
+    (match_cardinal_with_salt.__name__, _cardinal_salt_moves),
+]
+
+
+def compare_move_generators(board):
+    """Return the names of the move generators that don't yield the same
+    actions in the same order as their ACTION_FACTORIES counterpart."""
+    open_elements = dict(board.open_tiles)
+    mismatches = []
+    for (name, generator), action_factory in zip(MOVE_GENERATORS, ACTION_FACTORIES):
+        moves = []
+        generator(board, moves)
+        expected = [action.tiles for action in action_factory(board, open_elements)]
+        if [_move_action(move).tiles for move in moves] != expected:
+            mismatches.append(name)
+    return mismatches
+
+
+def _do_move(board, move):
+    first = move >> 7
+    second = move & 0x7f
+    if first == second:
+        return board.take_index(first)
+    return board.take_index(first), board.take_index(second)
+
+
+def _undo_move(board, move, taken):
+    first = move >> 7
+    second = move & 0x7f
+    if first == second:
+        board.set_index(first, taken)
+    else:
+        board.set_index(second, taken[1])
+        board.set_index(first, taken[0])
+
+
+def _move_action(move):
+    first = move >> 7
+    second = move & 0x7f
+    if first == second:
+        return RemoveSingle(BitBoard.cells[first])
+    return RemovePair(BitBoard.cells[first], BitBoard.cells[second])
+
+
+# move scorers rank the candidate actions at a node. each one is called with
+# the board just after the action was applied and what the action took, and
+# actions with higher scores are tried first.
+def unblocks_next_metal(board, action, taken):
+    for el in sorted(Element.Metals):
+        for h in board.find(el):
+            return int(board.is_open(h))
+    return 1
+
+
+def saves_salt(board, action, taken):
+    if not isinstance(taken, tuple):
+        taken = (taken,)
+    return -taken.count(Element.SALT)
+
+
+def opens_most_tiles(board, action, taken):
+    return board.open_count
+
+
+# a move ordering is a list of scorers, compared in turn to break ties. passing
+# ordering=None to solve_game keeps the fixed ACTION_FACTORIES order instead.
+DEFAULT_ORDERING = [
+    unblocks_next_metal,
+    saves_salt,
+    opens_most_tiles,
+]
+
+
+def _order_moves(board, moves, ordering):
+    scored = []
+    for i, move in enumerate(moves):
+        taken = _do_move(board, move)
+        action = _move_action(move)
+        score = tuple(-scorer(board, action, taken) for scorer in ordering)
+        _undo_move(board, move, taken)
+        scored.append((score, i, move))
+    scored.sort(key=lambda item: item[:2])
+    return [move for score, i, move in scored]
+
+
+def salts_cover_cardinals(board):
+    """Every cardinal left over after pairing needs a salt to go with."""
+    unpaired = sum(board.count(el) % 2 for el in Element.Cardinals)
+    salts = board.count(Element.SALT)
+    return unpaired <= salts and (salts - unpaired) % 2 == 0
+
+
+def mors_vitae_balanced(board):
+    return board.count(Element.MORS) == board.count(Element.VITAE)
+
+
+def quicksilver_matches_metals(board):
+    """Every metal but gold consumes exactly one quicksilver."""
+    metals = sum(board.count(el) for el in Element.Metals if el is not Element.GOLD)
+    return board.count(Element.QUICKSILVER) == metals
+
+
+def metals_can_open(board):
+    """A metal can't be removed before the metals below it, so each one has to
+    be able to open up while all the metals above it are still in place."""
+    live_metals = [(el, h) for el in sorted(Element.Metals) for h in board.find(el)]
+    for i, (el, h) in enumerate(live_metals):
+        if not board.could_open(h, [h2 for el2, h2 in live_metals[i+1:]]):
+            return False
+    return True
+
+
+def _forced_pairs(board):
+    if board.count(Element.MORS) == 1 and board.count(Element.VITAE) == 1:
+        yield next(board.find(Element.MORS)), next(board.find(Element.VITAE))
+
+    if not board.count(Element.SALT):
+        for el in Element.Cardinals:
+            if board.count(el) == 2:
+                yield tuple(board.find(el))
+
+    if board.count(Element.QUICKSILVER) == 1:
+        metals = [h for el in Element.Metals if el is not Element.GOLD for h in board.find(el)]
+        if len(metals) == 1:
+            yield metals[0], next(board.find(Element.QUICKSILVER))
+
+
+def forced_pairs_unblocked(board):
+    """When only two tiles are left that can be removed with each other,
+    neither may be walled in by the other."""
+    for h1, h2 in _forced_pairs(board):
+        if not board.could_open(h1, [h2]) or not board.could_open(h2, [h1]):
+            return False
+    return True
+
+
+# cheap tests that a BitBoard can still be cleared. a board failing any of
+# them is dead and isn't searched any further.
+FEASIBILITY_CHECKS = [
+    mors_vitae_balanced,
+    quicksilver_matches_metals,
+    salts_cover_cardinals,
+    metals_can_open,
+    forced_pairs_unblocked,
+]
+
+
 class UnsolveableBoardError(Exception):
     pass
 
 
-def solve_game(board):
-    return _solve_game(board, set())
+class SearchBudgetExhausted(Exception):
+    """The search hit its time or node limit before it could either solve the
+    board or prove it unsolveable."""
+    def __init__(self, stats):
+        super(SearchBudgetExhausted, self).__init__(
+            f"gave up after expanding {stats.nodes} nodes")
+        self.stats = stats
+
+
+class _SearchInterrupted(Exception):
+    pass
+
+
+class SearchStats(object):
+    """Counters describing a search.
+
+    The basic counters are always kept. Pass detailed=True to also record how
+    long each action factory ran and how many actions it yielded, and how
+    many nodes were expanded and children tried at each depth; that costs a
+    little on every node. If on_node is given it is called as on_node(board,
+    depth) on every sample_interval-th expanded node, which is enough to hang
+    a sampling profiler or progress display off of. It isn't called from
+    parallel workers.
+
+    """
+    def __init__(self, detailed=False, on_node=None, sample_interval=1):
+        self.detailed = detailed
+        self.on_node = on_node
+        self.sample_interval = sample_interval
+
+        self.nodes = 0
+        self.max_depth = 0
+        self.table_hits = 0
+        self.backtracks = 0
+        self.seconds = 0.0
+        self.prunes = collections.Counter()
+
+        self.factory_seconds = collections.Counter()
+        self.factory_yields = collections.Counter()
+        self.expanded_by_depth = collections.Counter()
+        self.children_by_depth = collections.Counter()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["on_node"] = None
+        return state
+
+    @property
+    def branching_factor(self):
+        return {depth: self.children_by_depth[depth] / expanded
+                for depth, expanded in sorted(self.expanded_by_depth.items())}
+
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.table_hits += other.table_hits
+        self.backtracks += other.backtracks
+        self.prunes.update(other.prunes)
+        self.factory_seconds.update(other.factory_seconds)
+        self.factory_yields.update(other.factory_yields)
+        self.expanded_by_depth.update(other.expanded_by_depth)
+        self.children_by_depth.update(other.children_by_depth)
+
+    def as_dict(self):
+        stats = {
+            "nodes": self.nodes,
+            "max_depth": self.max_depth,
+            "table_hits": self.table_hits,
+            "backtracks": self.backtracks,
+            "seconds": self.seconds,
+            "prunes": dict(self.prunes),
+        }
+        if self.detailed:
+            stats.update(
+                factory_seconds=dict(self.factory_seconds),
+                factory_yields=dict(self.factory_yields),
+                branching_factor=self.branching_factor,
+            )
+        return stats
+
+
+# how many nodes the search expands between calls to its interrupt hook.
+INTERRUPT_INTERVAL = 256
+
+
+class SearchBudget(object):
+    """Raises SearchBudgetExhausted once the deadline (a time.monotonic()
+    value) passes or the search expands max_nodes nodes.
+
+    Budgets are checked every INTERRUPT_INTERVAL nodes, so the search can run
+    slightly past either limit. nodes overrides the count in stats, for
+    searches split over several processes.
+
+    """
+    def __init__(self, deadline=None, max_nodes=None):
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+
+    def __call__(self, stats, nodes=None):
+        if nodes is None:
+            nodes = stats.nodes
+        if self.max_nodes is not None and nodes >= self.max_nodes:
+            raise SearchBudgetExhausted(stats)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchBudgetExhausted(stats)
+
+
+def solve_game(board, table=None, checks=FEASIBILITY_CHECKS, ordering=None, stats=None, workers=None,
+               time_limit=None, max_nodes=None):
+    """Find a list of actions that clears the board.
+
+    Raises UnsolveableBoardError if there is none, or SearchBudgetExhausted if
+    time_limit seconds pass or max_nodes nodes are expanded first. With
+    workers, max_nodes counts the nodes expanded by all of them together,
+    though each may run up to INTERRUPT_INTERVAL nodes past it. Each worker
+    process keeps one empty table configured like `table` (same capacity,
+    eviction and verify) for all the subtrees it searches, so size it for one
+    worker's memory.
+
+    """
+    if stats is None:
+        stats = SearchStats()
+
+    budget = None
+    if time_limit is not None or max_nodes is not None:
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
+        budget = SearchBudget(deadline, max_nodes)
+
+    start = time.perf_counter()
+    try:
+        if workers:
+            table_options = {}
+            if table is not None:
+                table_options = dict(capacity=table.capacity, eviction=table.eviction, verify=table.verify)
+            return _solve_game_parallel(BitBoard.from_board(board), workers, checks, ordering, stats, budget,
+                                        table_options)
+
+        if table is None:
+            table = TranspositionTable()
+        return _solve_game(BitBoard.from_board(board), table, checks, ordering, stats, budget)
+    finally:
+        stats.seconds += time.perf_counter() - start
+
+
+def _generate_moves(board, ordering, stats=None):
+    moves = []
+    if stats is not None:
+        for name, generator in MOVE_GENERATORS:
+            before = len(moves)
+            start = time.perf_counter()
+            generator(board, moves)
+            stats.factory_seconds[name] += time.perf_counter() - start
+            stats.factory_yields[name] += len(moves) - before
+    else:
+        for name, generator in MOVE_GENERATORS:
+            generator(board, moves)
+    if ordering:
+        moves = _order_moves(board, moves, ordering)
+    return iter(moves)
+
+
+def _failed_check(board, checks):
+    for check in checks:
+        if not check(board):
+            return check
+    return None
 
 
-def _solve_game(board, seen_states):
-    live_elements = [(h, e) for h, e in board.tiles if e is not None]
-    if not live_elements:
+def _solve_game(board, dead_states, checks, ordering, stats, interrupt=None):
+    """Depth-first search for a solution, modifying the board in place.
+
+    Actions are applied to the board as the search descends and undone as it
+    backtracks, and the search keeps its own stack of pending actions rather
+    than recursing, so nothing is copied per node and deep games can't hit the
+    recursion limit.
+
+    """
+    if not board.occupied:
         return []
 
-    open_elements = {h: e for h, e in live_elements if board.is_open(h)}
-    if not open_elements:
+    failed = _failed_check(board, checks)
+    if failed is not None:
+        stats.prunes[failed.__name__] += 1
         raise UnsolveableBoardError
 
-    for action_factory in ACTION_FACTORIES:
-        for action in action_factory(board, open_elements):
-            new_board = board.clone()
-            action.do(new_board)
+    # only pay for the detailed counters when they were asked for
+    detailed = stats if stats.detailed else None
+    on_node = stats.on_node
+
+    stats.nodes += 1
+    if detailed:
+        stats.expanded_by_depth[0] += 1
+    path = []
+    frames = [_generate_moves(board, ordering, detailed)]
+    while frames:
+        move = next(frames[-1], None)
+        if move is None:
+            frames.pop()
+            if path:
+                stats.backtracks += 1
+                dead_states.add(board)
+                move, taken = path.pop()
+                _undo_move(board, move, taken)
+            continue
+
+        if detailed:
+            stats.children_by_depth[len(path)] += 1
+
+        taken = _do_move(board, move)
+        if board in dead_states:
+            stats.table_hits += 1
+            _undo_move(board, move, taken)
+            continue
+
+        if not board.occupied:
+            return [_move_action(move) for move, taken in path] + [_move_action(move)]
+
+        failed = _failed_check(board, checks)
+        if failed is not None:
+            stats.prunes[failed.__name__] += 1
+            dead_states.add(board)
+            _undo_move(board, move, taken)
+            continue
+
+        stats.nodes += 1
+        if interrupt is not None and not stats.nodes % INTERRUPT_INTERVAL:
+            interrupt(stats)
+
+        path.append((move, taken))
+        frames.append(_generate_moves(board, ordering, detailed))
+
+        depth = len(path)
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if detailed:
+            stats.expanded_by_depth[depth] += 1
+        if on_node is not None and not stats.nodes % stats.sample_interval:
+            on_node(board, depth)
 
-            if hash(new_board) in seen_states:
-                continue
+    raise UnsolveableBoardError
 
-            try:
-                return [action] + _solve_game(new_board, seen_states)
-            except UnsolveableBoardError:
-                seen_states.add(hash(new_board))
 
+def _split_search(board, depth, checks, ordering, seen):
+    """Yield the distinct sequences of `depth` moves from the current board,
+    or shorter ones that clear it."""
+    if not depth or not board.occupied:
+        yield []
+        return
+
+    for move in _generate_moves(board, ordering):
+        taken = _do_move(board, move)
+        if board.key not in seen and _failed_check(board, checks) is None:
+            seen.add(board.key)
+            for rest in _split_search(board, depth - 1, checks, ordering, seen):
+                yield [move] + rest
+        _undo_move(board, move, taken)
+
+
+_cancelled = None
+_nodes = None
+_dead_states = None
+
+
+def _init_worker(cancelled, nodes, table_options):
+    global _cancelled, _nodes, _dead_states
+    _cancelled = cancelled
+    _nodes = nodes
+    # a dead state is dead whichever subtree finds it, so share one table
+    # across every subtree this worker searches
+    _dead_states = TranspositionTable(**table_options)
+
+
+def _check_cancelled(stats):
+    if _cancelled.is_set():
+        raise _SearchInterrupted
+
+
+def _solve_subtree(board, prefix, checks, ordering, budget, detailed):
+    for move in prefix:
+        _do_move(board, move)
+
+    stats = SearchStats(detailed)
+    counted = 0
+
+    def count_nodes():
+        """Add the nodes expanded since the last call to the count shared by
+        every worker and return the new total."""
+        nonlocal counted
+        with _nodes.get_lock():
+            _nodes.value += stats.nodes - counted
+            total = _nodes.value
+        counted = stats.nodes
+        return total
+
+    def interrupt(stats):
+        _check_cancelled(stats)
+        if budget is not None:
+            budget(stats, count_nodes())
+
+    try:
+        # the other workers may have used up the budget already
+        if budget is not None:
+            budget(stats, count_nodes())
+        solution = _solve_game(board, _dead_states, checks, ordering, stats, interrupt)
+    except (UnsolveableBoardError, _SearchInterrupted):
+        return None, stats, False
+    except SearchBudgetExhausted:
+        return None, stats, True
+    finally:
+        count_nodes()
+    return [_move_action(move) for move in prefix] + solution, stats, False
+
+
+def _solve_game_parallel(board, workers, checks, ordering, stats, budget, table_options, split_depth=2):
+    """Split the search over the first few moves across a pool of processes.
+
+    Whichever worker finds a solution first has its result returned and the
+    rest are told to stop. The solution may differ from the one a serial
+    search would find first.
+
+    """
+    failed = _failed_check(board, checks)
+    if failed is not None:
+        stats.prunes[failed.__name__] += 1
+        raise UnsolveableBoardError
+
+    prefixes = list(_split_search(board, split_depth, checks, ordering, set()))
+    if not prefixes:
+        raise UnsolveableBoardError
+
+    timeout = None
+    if budget is not None and budget.deadline is not None:
+        timeout = max(budget.deadline - time.monotonic(), 0)
+
+    gave_up = False
+    cancelled = multiprocessing.Event()
+    nodes = multiprocessing.Value("q", 0)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                initargs=(cancelled, nodes, table_options)) as pool:
+        futures = [pool.submit(_solve_subtree, board.clone(), prefix, checks, ordering, budget, stats.detailed)
+                   for prefix in prefixes]
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                solution, worker_stats, worker_gave_up = future.result()
+                stats.merge(worker_stats)
+                gave_up = gave_up or worker_gave_up
+                if solution is not None:
+                    return solution
+        except concurrent.futures.TimeoutError:
+            gave_up = True
+        finally:
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+
+    if gave_up:
+        raise SearchBudgetExhausted(stats)
     raise UnsolveableBoardError
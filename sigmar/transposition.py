@@ -0,0 +1,64 @@
+import collections
+
+
+class TranspositionTable(object):
+    """A bounded record of board states the solver has already found to be
+    dead ends.
+
+    Boards are looked up by their incrementally maintained zobrist key. Once
+    the table holds `capacity` states, adding another evicts one according to
+    `eviction`: "lru" drops the state that was least recently added or hit,
+    "fifo" drops the oldest one. If `verify` is set, each entry also stores
+    the board's full key so that two different boards sharing a zobrist key
+    can't wrongly prune a solvable branch. That roughly triples the memory per
+    entry.
+
+    """
+    EVICTION_POLICIES = ("lru", "fifo")
+
+    def __init__(self, capacity=1 << 20, eviction="lru", verify=False):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if eviction not in self.EVICTION_POLICIES:
+            raise ValueError(f"unknown eviction policy {eviction!r}")
+
+        self.capacity = capacity
+        self.eviction = eviction
+        self.verify = verify
+        self.entries = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collisions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, board):
+        key = board.key
+        if key not in self.entries:
+            self.misses += 1
+            return False
+
+        if self.verify and self.entries[key] != board.full_key():
+            self.collisions += 1
+            self.misses += 1
+            return False
+
+        if self.eviction == "lru":
+            self.entries.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def add(self, board):
+        key = board.key
+        self.entries[key] = board.full_key() if self.verify else None
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
@@ -1,14 +1,37 @@
-import cv2
-import numpy
+import os
 
-from keras.models import load_model
+import numpy
 
-from sigmar.hex import Point, Orientation, Layout
+from sigmar.hex import Point, Orientation, Layout, get_table
 from sigmar.board import Board, Element
 
 
+# where the board sits in a screenshot of the game window.
+LAYOUT = Layout(Orientation.POINTY, Point(38, 38), Point(1100, 516))
+
+# the exported NumPy classifier is preferred when it's around since it loads
+# far faster and lighter than the Keras one. see `training export`.
+MODEL_PATHS = ("elements.npz", "elements.h5")
+
+# per-element average tiles for the cheap nearest-centroid backend. see
+# `training centroids`.
+CENTROIDS_PATH = "centroids.npz"
+
+# tiles the centroid backend is less sure of than this are handed to the
+# neural model when running the cascade backend.
+CASCADE_THRESHOLD = 0.9
+
+BACKENDS = ("auto", "neural", "keras", "numpy", "centroid", "cascade")
+
+# the size of a tile after normalize_image
+TILE_SHAPE = (38, 45)
+
+
+# cv2 and keras take a long time to import so they're only pulled in once
+# something actually needs them. that keeps the solver side of things snappy.
 def normalize_image(image):
     """Apply some basic image normalization to cut down on noise."""
+    import cv2
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
 
     image = image[0:38, 0:45]  # normalize slightly different image sizes
@@ -17,6 +40,91 @@ def normalize_image(image):
     return image
 
 
+_models = {}
+
+
+def _load_model(path, dtype):
+    if path.endswith(".npz"):
+        with numpy.load(path) as data:
+            is_centroids = "centroids" in data.files
+        if is_centroids:
+            from sigmar.vision.centroid_model import CentroidModel
+            return CentroidModel.load(path)
+
+        from sigmar.vision.numpy_model import NumpyModel
+        return NumpyModel.load(path, dtype)
+
+    from keras.models import load_model
+    return load_model(path)
+
+
+def get_model(path=None, dtype="float32"):
+    """Load the classifier once per process, reloading it if the file changes.
+
+    .npz files hold either centroids or weights for the NumPy backend, which
+    keeps them as dtype. anything else is loaded with Keras. By default, the
+    first of MODEL_PATHS that exists is used.
+
+    """
+    if path is None:
+        path = next((p for p in MODEL_PATHS if os.path.exists(p)), MODEL_PATHS[-1])
+
+    modified = os.stat(path).st_mtime_ns
+    cached = _models.get((path, dtype))
+    if cached is None or cached[0] != modified:
+        _models[(path, dtype)] = (modified, _load_model(path, dtype))
+    return _models[(path, dtype)][1]
+
+
+_cascades = {}
+
+
+def get_classifier(backend="auto", dtype="float32"):
+    """Pick a tile classifier by name.
+
+    "neural" is the best available neural model, "keras" and "numpy" force
+    one of them and "centroid" is the nearest-centroid model on its own.
+    "cascade" runs the centroid model and falls back to the neural one for
+    tiles below CASCADE_THRESHOLD. "auto" is the cascade if centroids have
+    been built and the neural model otherwise.
+
+    """
+    if backend == "auto":
+        backend = "cascade" if os.path.exists(CENTROIDS_PATH) else "neural"
+
+    if backend == "neural":
+        return get_model(dtype=dtype)
+    elif backend == "keras":
+        return get_model(MODEL_PATHS[1])
+    elif backend == "numpy":
+        return get_model(MODEL_PATHS[0], dtype)
+    elif backend == "centroid":
+        return get_model(CENTROIDS_PATH)
+    elif backend == "cascade":
+        from sigmar.vision.centroid_model import CascadeModel
+        primary, fallback = get_model(CENTROIDS_PATH), get_model(dtype=dtype)
+        # keep the same cascade (and its stats) until either model reloads
+        key = (id(primary), id(fallback))
+        if key not in _cascades:
+            _cascades.clear()
+            _cascades[key] = CascadeModel(primary, fallback, CASCADE_THRESHOLD)
+        return _cascades[key]
+    raise ValueError(f"unknown backend {backend!r}")
+
+
+def warm_up(backend="auto"):
+    """Load the classifier and run a throwaway prediction so the first real
+    board doesn't pay for model deserialization and graph setup."""
+    from sigmar.vision.centroid_model import CascadeModel
+    model = get_classifier(backend)
+    tile = numpy.zeros((1, numpy.prod(TILE_SHAPE)), dtype="float32")
+    model.predict(tile)
+    # the cascade may be sure enough of the blank tile to never consult its
+    # fallback, so warm that up directly
+    if isinstance(model, CascadeModel):
+        model.fallback.predict(tile, batch_size=1)
+
+
 def flatten_image_array(images):
     """Turn raw image data into data Tensorflow likes."""
     images = numpy.array(images)
@@ -26,21 +134,119 @@ def flatten_image_array(images):
     return images
 
 
-def detect_board(image):
-    """Use a trained model to scrape a board's state from a screenshot."""
-    model = load_model("elements.h5")
+# the cells of the board in Board.new() order, which is the order everything
+# in here reports tiles in.
+BOARD_HEXES = tuple(h for h, el in Board.new().tiles)
+
+
+def board_table(layout=LAYOUT):
+    """Return the shared pixel geometry table for the board's cells under layout."""
+    return get_table(layout, BOARD_HEXES)
+
+
+def tile_boxes(layout):
+    """Return the cells of the board and the (left, top, right, bottom) box to crop for each.
+
+    Box coordinates are rounded the same way PIL's Image.crop rounds them.
+    The boxes are kept with the layout's board_table, so this is cheap to
+    call for every screenshot.
+
+    """
+    return BOARD_HEXES, board_table(layout).inner_boxes(inset_x=10)
+
+
+def crop_tiles(grayscale, layout, indices=None):
+    """Slice tiles out of a grayscale screenshot array and normalize them.
+
+    indices picks out cells by their position in Board.new() order; all of
+    them are cropped by default.
+
+    """
+    hexes, boxes = tile_boxes(layout)
+    if indices is not None:
+        hexes = [hexes[i] for i in indices]
+        boxes = [boxes[i] for i in indices]
+    tiles = [normalize_image(numpy.ascontiguousarray(grayscale[top:bottom, left:right]))
+             for left, top, right, bottom in boxes]
+    return hexes, tiles
+
+
+def classify_tiles(image, model, layout):
+    """Classify every tile in the screenshot with a single call to the model.
+
+    Returns the cells in Board.new() order and an array of per-element
+    probabilities for each.
+
+    """
+    grayscale = numpy.asarray(image.convert("L"))
+    hexes, tiles = crop_tiles(grayscale, layout)
+    probabilities = model.predict(flatten_image_array(tiles), batch_size=len(tiles))
+    return hexes, probabilities
+
+
+def detect_board(image, with_probabilities=False, backend="auto"):
+    """Use a trained model to scrape a board's state from a screenshot.
+
+    With with_probabilities, the per-tile class probabilities (one row per
+    cell in Board.new() order) are returned after the board and layout.
+
+    """
+    model = get_classifier(backend)
 
     board = Board.new()
-    layout = Layout(Orientation.POINTY, Point(38, 38), Point(1100, 516))
-
-    grayscale = image.convert("L")
-    for i, (h, el) in enumerate(board.tiles):
-        poly = list(layout.polygon_corners(h))
-        cropped = grayscale.crop((poly[3].x+10, poly[3].y, poly[0].x-10, poly[0].y))
-        normalized = normalize_image(numpy.array(cropped))
-        prediction, = model.predict_classes(flatten_image_array([normalized]))
-        el = Element(prediction)
+    layout = LAYOUT
+
+    hexes, probabilities = classify_tiles(image, model, layout)
+    for h, prediction in zip(hexes, probabilities.argmax(axis=1)):
+        el = Element(int(prediction))
         if el is not Element.EMPTY:
             board.set(h, el)
 
+    if with_probabilities:
+        return board, layout, probabilities
     return board, layout
+
+
+# tile signatures average 4x5 pixel blocks of the tile down to 8x8 and keep
+# the top four bits of each, which is enough to see a marble appear or vanish
+# but shrugs off most compression and lighting noise.
+_SIGNATURE_CROP = (slice(3, 35), slice(2, 42))
+
+
+def tile_signatures(image, layout=LAYOUT):
+    """Return a cheap fingerprint of every tile in the screenshot."""
+    grayscale = numpy.asarray(image.convert("L"))
+    hexes, boxes = tile_boxes(layout)
+    signatures = []
+    for left, top, right, bottom in boxes:
+        tile = grayscale[top:bottom, left:right][_SIGNATURE_CROP].astype("uint16")
+        blocks = tile.reshape(8, 4, 8, 5).mean(axis=(1, 3))
+        signatures.append((blocks.astype("uint8") >> 4).tobytes())
+    return signatures
+
+
+def reread_board(previous_image, previous_board, image, backend="auto", previous_signatures=None):
+    """Update a board read from an earlier screenshot to match a new one.
+
+    Only tiles whose signature changed between the screenshots are classified
+    again. Pass previous_signatures (from tile_signatures) to avoid
+    recomputing them. Returns the new board, the hexes that were re-read and
+    the new screenshot's signatures.
+
+    """
+    if previous_signatures is None:
+        previous_signatures = tile_signatures(previous_image, LAYOUT)
+    signatures = tile_signatures(image, LAYOUT)
+
+    changed = [i for i, (old, new) in enumerate(zip(previous_signatures, signatures)) if old != new]
+    board = previous_board.clone()
+    if not changed:
+        return board, [], signatures
+
+    grayscale = numpy.asarray(image.convert("L"))
+    hexes, tiles = crop_tiles(grayscale, LAYOUT, changed)
+    probabilities = get_classifier(backend).predict(flatten_image_array(tiles), batch_size=len(tiles))
+    for h, prediction in zip(hexes, probabilities.argmax(axis=1)):
+        el = Element(int(prediction))
+        board.set(h, el if el is not Element.EMPTY else None)
+    return board, hexes, signatures
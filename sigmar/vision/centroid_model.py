@@ -0,0 +1,132 @@
+import collections
+import time
+
+import numpy
+
+
+# a tile further from its nearest centroid than this percentile of that
+# element's training images is treated as unlike anything seen in training.
+OUTLIER_PERCENTILE = 99
+
+
+class CentroidModel(object):
+    """Classifies tiles by their distance to each element's average image.
+
+    Tiles are compared to every centroid with one matrix product. Distances
+    are turned into probabilities with a softmax scaled by `temperature`.
+    fit() sets it from the typical margin between a training image's own
+    centroid and the nearest other one, so that a typical tile comes out
+    well above CASCADE_THRESHOLD and one about as close to two centroids
+    near 50%.
+
+    The margin alone says nothing about how close a tile actually is, so
+    fit() also records a radius per element. A tile further than that from
+    its nearest centroid keeps its most likely element but at no more than
+    about 50% confidence, which sends it to a cascade's fallback.
+
+    """
+    def __init__(self, centroids, temperature, radii=None):
+        self.centroids = centroids.astype("float32")
+        self.temperature = float(temperature)
+        if radii is None:
+            radii = numpy.full(len(centroids), numpy.inf)
+        self.radii = numpy.asarray(radii, dtype="float32")
+
+        # elements with no training images can never be predicted
+        self.known = ~numpy.isnan(self.centroids).any(axis=1)
+        self.centroids[~self.known] = 0
+        self.centroid_norms = (self.centroids ** 2).sum(axis=1)
+
+    @classmethod
+    def fit(cls, data, labels, classes):
+        data = numpy.asarray(data, dtype="float32")
+        labels = numpy.asarray(labels)
+        centroids = numpy.full((classes, data.shape[1]), numpy.nan, dtype="float32")
+        for label in range(classes):
+            members = data[labels == label]
+            if len(members):
+                centroids[label] = members.mean(axis=0)
+
+        model = cls(centroids, temperature=1)
+        distances = numpy.sqrt(model.distances(data))
+        rows = numpy.arange(len(data))
+        own = distances[rows, labels]
+        for label in range(classes):
+            if (labels == label).any():
+                model.radii[label] = numpy.percentile(own[labels == label], OUTLIER_PERCENTILE)
+        distances[rows, labels] = numpy.inf
+        margin = (distances.min(axis=1) - own).mean()
+        model.temperature = max(float(margin) / 5, 1e-6)
+        return model
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path) as data:
+            # centroids built before radii were recorded don't gate on distance
+            radii = data["radii"] if "radii" in data else None
+            return cls(data["centroids"], data["temperature"], radii)
+
+    def save(self, path):
+        centroids = self.centroids.copy()
+        centroids[~self.known] = numpy.nan
+        numpy.savez(path, centroids=centroids, temperature=numpy.array(self.temperature), radii=self.radii)
+
+    def distances(self, x):
+        """Squared euclidean distance from every row of x to every centroid."""
+        x = numpy.asarray(x, dtype="float32")
+        distances = (x ** 2).sum(axis=1, keepdims=True) - 2 * x @ self.centroids.T + self.centroid_norms
+        numpy.maximum(distances, 0, out=distances)
+        distances[:, ~self.known] = numpy.inf
+        return distances
+
+    def predict(self, x, batch_size=None):
+        distances = numpy.sqrt(self.distances(x))
+        logits = -distances / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = numpy.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        # mixing with a uniform guess keeps the ranking but caps confidence
+        nearest = distances.argmin(axis=1)
+        outliers = distances[numpy.arange(len(distances)), nearest] > self.radii[nearest]
+        if outliers.any():
+            uniform = self.known / self.known.sum()
+            probabilities[outliers] = (probabilities[outliers] + uniform) / 2
+        return probabilities
+
+    def predict_classes(self, x, batch_size=None):
+        return self.distances(x).argmin(axis=1)
+
+
+class CascadeModel(object):
+    """Runs a cheap model over every tile and only asks the expensive fallback
+    model about the tiles the cheap one is less than `threshold` sure of.
+
+    `stats` keeps running totals of tiles seen, tiles sent to the fallback
+    and the seconds spent in each model.
+
+    """
+    def __init__(self, primary, fallback, threshold):
+        self.primary = primary
+        self.fallback = fallback
+        self.threshold = threshold
+        self.stats = collections.Counter()
+
+    def predict(self, x, batch_size=None):
+        x = numpy.asarray(x, dtype="float32")
+
+        start = time.perf_counter()
+        probabilities = self.primary.predict(x)
+        self.stats["primary seconds"] += time.perf_counter() - start
+        self.stats["tiles"] += len(x)
+
+        unsure = probabilities.max(axis=1) < self.threshold
+        if unsure.any():
+            start = time.perf_counter()
+            probabilities[unsure] = self.fallback.predict(x[unsure], batch_size=int(unsure.sum()))
+            self.stats["fallback seconds"] += time.perf_counter() - start
+            self.stats["fallback tiles"] += int(unsure.sum())
+        return probabilities
+
+    def predict_classes(self, x, batch_size=None):
+        return self.predict(x).argmax(axis=1)
@@ -0,0 +1,90 @@
+import numpy
+
+
+def _relu(x):
+    return numpy.maximum(x, 0, out=x)
+
+
+def _softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    numpy.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+def _linear(x):
+    return x
+
+
+ACTIVATIONS = {
+    "relu": _relu,
+    "softmax": _softmax,
+    "linear": _linear,
+}
+
+DTYPES = ("float32", "float16", "int8")
+
+
+class _Dense(object):
+    def __init__(self, weights, bias, activation, dtype):
+        self.bias = bias.astype("float32")
+        self.activation = ACTIVATIONS[activation]
+
+        if dtype == "int8":
+            # symmetric per-output quantization: weights ~= quantized * scale
+            scale = numpy.abs(weights).max(axis=0) / 127
+            scale[scale == 0] = 1
+            self.weights = numpy.round(weights / scale).astype("int8")
+            self.scale = scale.astype("float32")
+        else:
+            self.weights = weights.astype(dtype)
+            self.scale = None
+
+    def __call__(self, x):
+        x = x @ self.weights.astype("float32", copy=False)
+        if self.scale is not None:
+            x *= self.scale
+        x += self.bias
+        return self.activation(x)
+
+
+class NumpyModel(object):
+    """Inference for the dense classifier built by train_model, with nothing
+    but NumPy.
+
+    The weights can be kept as float32, float16 or int8 (quantized per output
+    unit). They're widened to float32 for each matmul, so the lower precisions
+    save memory rather than time.
+
+    """
+    def __init__(self, layers, dtype="float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"unsupported dtype {dtype!r}")
+        self.dtype = dtype
+        self.layers = [_Dense(weights, bias, activation, dtype) for weights, bias, activation in layers]
+
+    @classmethod
+    def load(cls, path, dtype="float32"):
+        with numpy.load(path) as data:
+            layers = []
+            for i in range(int(data["layer_count"])):
+                layers.append((data[f"weights_{i}"], data[f"bias_{i}"], str(data[f"activation_{i}"])))
+        return cls(layers, dtype)
+
+    @staticmethod
+    def save(path, layers):
+        arrays = {"layer_count": numpy.array(len(layers))}
+        for i, (weights, bias, activation) in enumerate(layers):
+            arrays[f"weights_{i}"] = weights.astype("float32")
+            arrays[f"bias_{i}"] = bias.astype("float32")
+            arrays[f"activation_{i}"] = numpy.array(activation)
+        numpy.savez(path, **arrays)
+
+    def predict(self, x, batch_size=None):
+        x = numpy.asarray(x, dtype="float32")
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+    def predict_classes(self, x, batch_size=None):
+        return self.predict(x).argmax(axis=1)
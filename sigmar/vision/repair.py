@@ -0,0 +1,92 @@
+import numpy
+
+from sigmar.board import Board, DEAL_COUNTS, Element
+
+
+# a repair that has to relabel more tiles than this is more likely to be
+# papering over a bad screenshot than fixing a few misread tiles.
+MAX_REPAIRED_TILES = 4
+
+
+class BoardRepairError(Exception):
+    pass
+
+
+def _assignment(cost):
+    """Solve the square assignment problem for a cost matrix.
+
+    This is the O(n^3) Hungarian algorithm with its inner loop over columns
+    vectorized. Returns the column assigned to each row.
+
+    """
+    n = cost.shape[0]
+    u = numpy.zeros(n + 1)
+    v = numpy.zeros(n + 1)
+    owner = numpy.zeros(n + 1, dtype=int)  # owner[j] is the row using column j
+    way = numpy.zeros(n + 1, dtype=int)
+
+    for row in range(1, n + 1):
+        owner[0] = row
+        column = 0
+        min_slack = numpy.full(n + 1, numpy.inf)
+        used = numpy.zeros(n + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = owner[column]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            improved = ~used[1:] & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = column
+
+            next_column = numpy.argmin(numpy.where(used[1:], numpy.inf, min_slack[1:])) + 1
+            delta = min_slack[next_column]
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_slack[~used] -= delta
+
+            column = next_column
+            if owner[column] == 0:
+                break
+
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    assignment = numpy.zeros(n, dtype=int)
+    assignment[owner[1:] - 1] = numpy.arange(n)
+    return assignment
+
+
+def repair_board(probabilities, max_changes=MAX_REPAIRED_TILES):
+    """Find the most likely board with exactly the dealt number of each element.
+
+    probabilities has a row of per-element probabilities for each cell in
+    Board.new() order, as returned by detect_board. Each element gets as many
+    slots as DEAL_COUNTS says (the rest are EMPTY) and cells are assigned to
+    slots to maximize the total log probability. Returns the board and the
+    hexes whose label changed from the most likely one, or raises
+    BoardRepairError if more than max_changes of them had to.
+
+    """
+    board = Board.new()
+    hexes = [h for h, el in board.tiles]
+
+    slots = []
+    for el, count in DEAL_COUNTS.items():
+        slots += [el] * count
+    slots += [Element.EMPTY] * (len(hexes) - len(slots))
+    slots = numpy.array(slots)
+
+    log_probabilities = numpy.log(numpy.clip(numpy.asarray(probabilities, dtype="float64"), 1e-12, 1))
+    assigned = slots[_assignment(-log_probabilities[:, slots])]
+    predicted = log_probabilities.argmax(axis=1)
+
+    changed = [h for h, old, new in zip(hexes, predicted, assigned) if old != new]
+    if len(changed) > max_changes:
+        raise BoardRepairError(f"repairing the board would relabel {len(changed)} tiles")
+
+    for h, el in zip(hexes, assigned):
+        if el != Element.EMPTY:
+            board.set(h, Element(int(el)))
+    return board, changed
@@ -9,13 +9,31 @@ import numpy
 import cv2
 
 from keras.utils import to_categorical
-from keras.models import Sequential
+from keras.models import Sequential, load_model
 from keras.layers import Dense
 
-from sigmar.board import Board, Element
-from sigmar.hex import Point, Orientation, Layout
+from sigmar.board import Element
 from sigmar.windows import get_screenshot, set_window_foreground, click_new_game
-from sigmar.vision import normalize_image, flatten_image_array
+from sigmar.vision import (
+    BACKENDS,
+    CENTROIDS_PATH,
+    LAYOUT,
+    flatten_image_array,
+    get_classifier,
+    normalize_image,
+    tile_boxes,
+)
+from sigmar.vision.centroid_model import CentroidModel
+from sigmar.vision.numpy_model import DTYPES, NumpyModel
+
+
+# how far the NumPy backend's probabilities may drift from Keras' at each
+# weight precision.
+EXPORT_TOLERANCES = {
+    "float32": 1e-4,
+    "float16": 1e-2,
+    "int8": 5e-2,
+}
 
 
 def ensure_path(path):
@@ -31,13 +49,10 @@ def capture_tile_images():
     """Screenshot Sigmar's Garden and save images of each tile location to disk for manual classification."""
     image = get_screenshot()
 
-    board = Board.new()
-    layout = Layout(Orientation.POINTY, Point(38, 38), Point(1100, 516))
-
     ts = int(time.time())
-    for i, (h, el) in enumerate(board.tiles):
-        poly = list(layout.polygon_corners(h))
-        cropped = image.crop((poly[3].x+10, poly[3].y, poly[0].x-10, poly[0].y))
+    hexes, boxes = tile_boxes(LAYOUT)
+    for i, box in enumerate(boxes):
+        cropped = image.crop(box)
         cropped.save(f"training/{ts}-{i}.png")
 
 
@@ -69,6 +84,16 @@ def load_label(name):
     return images[:partition_point], images[partition_point:]
 
 
+def load_all_labels():
+    """Load every classified image along with its element."""
+    images, labels = [], []
+    for el in Element:
+        training_images, test_images = load_label(el.name.upper())
+        images += training_images + test_images
+        labels += [el.value] * (len(training_images) + len(test_images))
+    return flatten_image_array(images), numpy.array(labels)
+
+
 def train_model():
     """Use human classified images to train a neural net to classify Sigmar's Garden marbles."""
     training_data, training_labels = [], []
@@ -111,10 +136,86 @@ def train_model():
     model.save("elements.h5")
 
 
+def export_model():
+    """Write the trained Keras model's weights out for the NumPy backend."""
+    model = load_model("elements.h5")
+    layers = []
+    for layer in model.layers:
+        weights, bias = layer.get_weights()
+        layers.append((weights, bias, layer.get_config()["activation"]))
+    NumpyModel.save("elements.npz", layers)
+    print("Exported the model to elements.npz.")
+
+
+def verify_export():
+    """Check that the NumPy backend agrees with Keras on every labeled image."""
+    data, labels = load_all_labels()
+
+    expected = load_model("elements.h5").predict(data)
+    failed = False
+    for dtype in DTYPES:
+        actual = NumpyModel.load("elements.npz", dtype).predict(data)
+        difference = numpy.abs(actual - expected).max()
+        agreement = (actual.argmax(axis=1) == expected.argmax(axis=1)).mean()
+        ok = difference <= EXPORT_TOLERANCES[dtype]
+        failed = failed or not ok
+        print(f"{dtype:>8}: max difference {difference:.2e}, same class for {agreement:.2%} "
+              f"{'ok' if ok else 'TOO FAR OFF'}")
+
+    if failed:
+        sys.exit(1)
+
+
+def build_centroids():
+    """Average the classified images of each element for the nearest-centroid backend."""
+    data, labels = load_all_labels()
+    model = CentroidModel.fit(data, labels, len(Element))
+    model.save(CENTROIDS_PATH)
+    print(f"Saved centroids for {int(model.known.sum())} elements to {CENTROIDS_PATH}.")
+
+
+def evaluate_backends():
+    """Report the accuracy and per-board latency of every available backend.
+
+    Accuracy is measured on the classified images, which the models were
+    built from, so treat it as an upper bound.
+
+    """
+    data, labels = load_all_labels()
+    board = data[numpy.arange(91) % len(data)]
+
+    for backend in BACKENDS:
+        if backend == "auto":
+            continue
+
+        try:
+            model = get_classifier(backend)
+        except (OSError, ImportError) as e:
+            print(f"{backend:>9}: unavailable ({e})")
+            continue
+
+        accuracy = (model.predict(data).argmax(axis=1) == labels).mean()
+
+        timings = []
+        for i in range(10):
+            start = time.perf_counter()
+            model.predict(board, batch_size=len(board))
+            timings.append(time.perf_counter() - start)
+
+        line = f"{backend:>9}: accuracy {accuracy:.2%}, {min(timings) * 1000:.2f}ms per board"
+        if hasattr(model, "stats"):
+            line += f", {model.stats['fallback tiles'] / model.stats['tiles']:.1%} of tiles fell back"
+        print(line)
+
+
 def main():
     commands = {
         "generate": generate_raw_images,
         "train": train_model,
+        "export": export_model,
+        "verify": verify_export,
+        "centroids": build_centroids,
+        "evaluate": evaluate_backends,
     }
 
     try:
@@ -11,7 +11,8 @@ from ctypes import (
 
 import PIL.Image
 import PIL.ImageGrab
-import pyautogui
+
+from sigmar.execute import InputDriver
 
 
 NULL = 0
@@ -158,7 +159,11 @@ def get_window_rectangle(handle=None):
     return rect
 
 
+# pyautogui is imported where it's used since importing it is slow and it
+# isn't needed just to take screenshots.
 def click_in_window(client_x, client_y):
+    import pyautogui
+
     handle = _get_window_handle()
     set_window_foreground(handle)
     rect = get_window_rectangle(handle)
@@ -172,6 +177,8 @@ def click_in_window(client_x, client_y):
 
 
 def click_new_game():
+    import pyautogui
+
     set_window_foreground()
 
     center = pyautogui.locateCenterOnScreen("new_game_template.png")
@@ -184,3 +191,54 @@ def click_new_game():
     pyautogui.mouseUp(button="left", x=x, y=y)
     pyautogui.moveTo(x=100, y=100)
     time.sleep(6)
+
+
+class Win32Driver(InputDriver):
+    """Drives the game through Win32 and pyautogui.
+
+    The window is looked up and brought to the front once per attach() rather
+    than on every click, and the new game button is only searched for once.
+
+    """
+    def __init__(self):
+        import pyautogui
+        # we do our own waiting between clicks
+        pyautogui.PAUSE = 0
+        self.pyautogui = pyautogui
+
+        self.handle = None
+        self.rect = None
+        self.new_game_button = None
+
+    def attach(self):
+        self.handle = _get_window_handle()
+        set_window_foreground(self.handle)
+        self.rect = get_window_rectangle(self.handle)
+
+    def find_new_game_button(self):
+        if self.new_game_button is None:
+            center = self.pyautogui.locateCenterOnScreen("new_game_template.png")
+            if not center:
+                raise Exception("Couldn't find new game button, is Sigmar's Garden open?")
+            x, y = center
+            self.new_game_button = (x - self.rect.left, y - self.rect.top)
+        return self.new_game_button
+
+    def click(self, x, y, hold):
+        x += self.rect.left
+        y += self.rect.top
+        self.pyautogui.mouseDown(button="left", x=x, y=y)
+        time.sleep(hold)
+        self.pyautogui.mouseUp(button="left", x=x, y=y)
+
+    def move(self, x, y):
+        self.pyautogui.moveTo(x=x + self.rect.left, y=y + self.rect.top)
+
+    def grab(self, box):
+        return get_screenshot().crop(box)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def clock(self):
+        return time.monotonic()